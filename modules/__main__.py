@@ -1,6 +1,19 @@
 import sys
 
-from modules.idea import main
+
+def main():
+    # Try a running daemon first so that scripted calls skip importing click,
+    # rich and the database setup.
+    from modules.client import send_to_daemon
+
+    status = send_to_daemon(sys.argv[1:])
+    if status is not None:
+        sys.exit(status)
+
+    from modules.idea import main as idea_main
+
+    idea_main()
+
 
 if __name__ == "__main__":
     main()
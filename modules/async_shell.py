@@ -0,0 +1,146 @@
+import asyncio
+import shlex
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from prompt_toolkit import PromptSession
+from prompt_toolkit.completion import WordCompleter
+from prompt_toolkit.patch_stdout import patch_stdout
+
+from modules import maintenance
+from modules.database import run_maintenance
+from modules.idea import RenderCancelled, cli, console, render_cancel
+from modules.model import click_log
+
+# commands that redraw the whole screen until stopped, which the prompt cannot share
+screen_commands = ["watch"]
+# commands that hand the terminal to an editor, awaited before prompting again
+terminal_commands = ["edit", "e"]
+
+
+class AsyncShell:
+    """
+    An asyncio REPL for the idea commands built on prompt_toolkit.
+
+    Commands run one at a time in a single worker thread so that the sqlite
+    connection is never used concurrently, while the prompt keeps accepting
+    input, except while edit or e has handed the terminal to the editor.
+    Entering a new command while another is still running cancels the
+    rendering of the older one; its database work still completes. Once the
+    prompt has been idle for maintenance.idle_seconds, database maintenance
+    runs in the worker as well.
+    """
+
+    def __init__(self, prompt: str = "app> "):
+        self.session = PromptSession(
+            prompt, completer=WordCompleter(sorted(cli.commands.keys()))
+        )
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.lock = threading.Lock()
+        self.latest = 0
+        self.pending = set()
+        self.active = time.monotonic()
+        self.maintained = None
+
+    def _invoke(self, seq: int, args: list[str]):
+        """Run a single command in the worker thread."""
+        with self.lock:
+            # a command queued behind a newer one does its work but skips rendering
+            if seq == self.latest:
+                render_cancel.clear()
+            else:
+                render_cancel.set()
+        try:
+            cli.main(args=args, prog_name="idea", standalone_mode=False)
+        except RenderCancelled:
+            pass
+        except click.ClickException as e:
+            e.show()
+        except click.exceptions.Abort:
+            pass
+        except Exception as e:
+            click_log(f"Exception {e} raised processing {args = }")
+            console.print(f"[red]An unexpected error occurred: {e}[/red]")
+
+    def submit(self, args: list[str]) -> asyncio.Future:
+        """Queue args for the worker and cancel any render still in progress."""
+        with self.lock:
+            self.latest += 1
+            seq = self.latest
+            render_cancel.set()
+        self.active = time.monotonic()
+        return self._run_in_worker(self._invoke, seq, args)
+
+    def _run_in_worker(self, func, *args) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, func, *args)
+        self.pending.add(future)
+        future.add_done_callback(self.pending.discard)
+        return future
+
+    def _maintain(self):
+        """Run idle maintenance in the worker thread, logging any error."""
+        try:
+            run_maintenance(idle=True)
+        except Exception as e:
+            click_log(f"Exception {e} raised by idle maintenance")
+
+    async def maintain_when_idle(self):
+        """Queue maintenance when nothing has been entered or run for a while."""
+        while True:
+            await asyncio.sleep(maintenance.idle_seconds / 4)
+            now = time.monotonic()
+            if (
+                self.pending
+                or now - self.active < maintenance.idle_seconds
+                or (
+                    self.maintained is not None
+                    and now - self.maintained < maintenance.idle_interval
+                )
+            ):
+                continue
+            self.maintained = now
+            self._run_in_worker(self._maintain)
+
+    async def run(self):
+        idle = asyncio.create_task(self.maintain_when_idle())
+        with patch_stdout(raw=True):
+            while True:
+                try:
+                    line = await self.session.prompt_async()
+                except (EOFError, KeyboardInterrupt):
+                    break
+                line = line.strip()
+                if not line:
+                    continue
+                if line in ("exit", "quit"):
+                    break
+                try:
+                    args = shlex.split(line)
+                except ValueError as e:
+                    console.print(f"[red]{e}[/red]")
+                    continue
+                if args[0] in ("help", "?"):
+                    args = args[1:] + ["--help"]
+                if args[0] in screen_commands:
+                    console.print(
+                        f"[yellow]{args[0]} takes over the screen from the prompt, use it in idea shell instead[/yellow]"
+                    )
+                    continue
+                future = self.submit(args)
+                if args[0] in terminal_commands:
+                    # the prompt would read keys and redraw under the editor
+                    await future
+                    self.active = time.monotonic()
+            idle.cancel()
+            if self.pending:
+                await asyncio.wait(self.pending)
+        self.executor.shutdown()
+
+
+def run_async_shell():
+    """Start the asyncio shell and block until the user exits."""
+    console.print("Welcome to the idea shell!")
+    asyncio.run(AsyncShell().run())
@@ -0,0 +1,35 @@
+from functools import reduce
+from typing import Iterable, Iterator, List
+
+# Sets of idea ids as Python ints with bit n set for id n, so that combining
+# them is a single &, | or & ~ over machine words however many ids they hold.
+
+
+def from_ids(ids: Iterable[int]) -> int:
+    """
+    The bitmap of ids, built in a bytearray since setting bits one at a time
+    in an int would copy it for each id.
+    """
+    ids = [*ids]
+    if not ids:
+        return 0
+    bits = bytearray(max(ids) // 8 + 1)
+    for id in ids:
+        bits[id >> 3] |= 1 << (id & 7)
+    return int.from_bytes(bits, "little")
+
+
+def to_ids(bitmap: int) -> Iterator[int]:
+    """The ids in bitmap in increasing order."""
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+    for index, byte in enumerate(data):
+        while byte:
+            low = byte & -byte
+            yield index * 8 + low.bit_length() - 1
+            byte ^= low
+
+
+def select(include: List[int], exclude: List[int]) -> int:
+    """The ids in every bitmap of include, of which there is at least one, and
+    in none of exclude."""
+    return reduce(int.__and__, include) & ~reduce(int.__or__, exclude, 0)
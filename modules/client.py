@@ -0,0 +1,68 @@
+import json
+import os
+import shutil
+import socket
+import sys
+from typing import List, Optional
+
+from . import idea_home
+
+socket_path = os.path.join(idea_home, "idea.sock")
+
+# commands that need the local terminal or stdin or that manage the daemon itself
+local_commands = [
+    "shell",
+    "ashell",
+    "daemon",
+    "edit",
+    "e",
+    "set-home",
+    "watch",
+    "batch",
+]
+
+
+def _request(request: dict) -> Optional[dict]:
+    """Send request to the daemon and return its reply or None if no daemon is listening."""
+    if not os.path.exists(socket_path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(socket_path)
+            sock.sendall(json.dumps(request).encode() + b"\n")
+            sock.shutdown(socket.SHUT_WR)
+            chunks = []
+            while chunk := sock.recv(65536):
+                chunks.append(chunk)
+    except OSError:
+        return None
+    return json.loads(b"".join(chunks)) if chunks else None
+
+
+def send_to_daemon(argv: List[str]) -> Optional[int]:
+    """
+    Run the command given by argv in the daemon and write its output to stdout.
+    Returns the exit status or None when the command should run in this process instead.
+    """
+    if not argv or argv[0] in local_commands:
+        return None
+    colorterm = os.environ.get("COLORTERM", "")
+    reply = _request(
+        {
+            "argv": argv,
+            "cwd": os.getcwd(),
+            "columns": shutil.get_terminal_size().columns,
+            "tty": sys.stdout.isatty(),
+            "truecolor": colorterm in ("truecolor", "24bit"),
+        }
+    )
+    if reply is None:
+        return None
+    sys.stdout.write(reply["output"])
+    sys.stdout.flush()
+    return reply["status"]
+
+
+def stop_daemon() -> bool:
+    """Ask a running daemon to exit. Returns False if none was running."""
+    return _request({"stop": True}) is not None
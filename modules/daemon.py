@@ -0,0 +1,136 @@
+import contextlib
+import io
+import json
+import os
+import socket
+import socketserver
+import time
+
+import click
+from rich.console import Console
+
+from modules import idea, maintenance
+from modules.client import socket_path
+from modules.model import click_log
+
+
+def run_command(request: dict) -> dict:
+    """
+    Run a command from a client with the output of the idea console, click and
+    print captured and rendered for the client's terminal.
+    """
+    buffer = io.StringIO()
+    tty = request.get("tty", False)
+    saved_console = idea.console
+    idea.console = Console(
+        file=buffer,
+        width=request.get("columns", 80),
+        force_terminal=tty,
+        color_system=(
+            ("truecolor" if request.get("truecolor") else "256") if tty else None
+        ),
+    )
+    status = 0
+    saved_cwd = os.getcwd()
+    # positions refer to the view as it is now rather than to a list shown for
+    # an earlier request
+    idea.database.pos_to_id.clear()
+    try:
+        os.chdir(request.get("cwd", saved_cwd))
+        with contextlib.redirect_stdout(buffer), contextlib.redirect_stderr(buffer):
+            try:
+                # without standalone_mode, main returns the code of ctx.exit
+                status = (
+                    idea.cli.main(
+                        args=request["argv"], prog_name="idea", standalone_mode=False
+                    )
+                    or 0
+                )
+            except click.exceptions.Exit as e:
+                status = e.exit_code
+            except click.ClickException as e:
+                e.show(file=buffer)
+                status = e.exit_code
+            except click.exceptions.Abort:
+                status = 1
+            except Exception as e:
+                idea.console.print(
+                    f"[red]An unexpected error occurred in daemon: {e}[/red]"
+                )
+                status = 1
+    finally:
+        idea.console = saved_console
+        os.chdir(saved_cwd)
+    return {"output": buffer.getvalue(), "status": status}
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        request = json.loads(self.rfile.readline())
+        if request.get("stop"):
+            self.server.stopping = True
+            reply = {"output": "", "status": 0}
+        else:
+            reply = run_command(request)
+        self.wfile.write(json.dumps(reply).encode())
+
+
+class DaemonServer(socketserver.UnixStreamServer):
+    """
+    Handles one request at a time in the main thread so that the sqlite
+    connection and its caches stay warm between commands. After
+    maintenance.idle_seconds without a request, database maintenance runs, at
+    most every maintenance.idle_interval seconds.
+    """
+
+    stopping = False
+    timeout = maintenance.idle_seconds
+    maintained = None
+
+    def handle_timeout(self):
+        now = time.monotonic()
+        if (
+            self.maintained is not None
+            and now - self.maintained < maintenance.idle_interval
+        ):
+            return
+        self.maintained = now
+        try:
+            idea.run_maintenance(idle=True)
+        except Exception as e:
+            click_log(f"Exception {e} raised by idle maintenance")
+
+
+def _remove_stale_socket():
+    """Remove a socket left behind by a daemon that did not exit cleanly."""
+    if not os.path.exists(socket_path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            os.unlink(socket_path)
+            return
+    raise click.ClickException(f"A daemon is already listening on {socket_path}")
+
+
+def run_daemon():
+    """Serve commands on socket_path until stopped."""
+    _remove_stale_socket()
+    old_umask = os.umask(0o077)
+    try:
+        server = DaemonServer(socket_path, DaemonHandler)
+    finally:
+        os.umask(old_umask)
+    click_log(f"daemon listening on {socket_path}")
+    idea.console.print(f"idea daemon listening on {socket_path}")
+    try:
+        while not server.stopping:
+            server.handle_request()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        click_log("daemon stopped")
@@ -1,3 +1,4 @@
+import atexit
 import os
 
 # original_makedirs = os.makedirs
@@ -10,13 +11,23 @@ import os
 #
 #
 # os.makedirs = safe_makedirs
+import hashlib
+import heapq
+import json
+import random
 import re
 import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import List, Optional, Tuple
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
 
 import click
 
+from modules import bitmap, maintenance, minhash, tfidf, trigram, working_set
 from modules.model import click_log, timestamp
 
 from . import backup_dir, db_path, idea_home, log_dir
@@ -27,15 +38,1165 @@ def regexp(expr, item):
     return re.search(expr, item, re.IGNORECASE) is not None
 
 
-# Register the regex function with SQLite
-conn = sqlite3.connect(db_path)
-conn.create_function("REGEXP", 2, regexp)
-# conn = sqlite3.connect(db_path)
-c = conn.cursor()
+# Concurrent sessions: sqlite waits busy_timeout seconds for a lock and
+# write_transaction then retries up to busy_retries times, doubling the delay
+# from busy_backoff up to busy_backoff_max seconds
+busy_timeout = 0.1
+busy_retries = 6
+busy_backoff = 0.05
+busy_backoff_max = 1.0
+# update_idea retries a compare-and-swap this many times when another session
+# changed only columns other than those being written
+conflict_retries = 3
+# prepared statements the connection keeps besides one for each of IdeaStore's
+# statements, for the one-off DDL, maintenance and composed queries
+statement_cache_headroom = 32
 
 default_status_setting = 0
 default_state_setting = 0
+# rows fetched per round trip when streaming the view
+fetch_size = 256
+# approximate bytes of query results kept by the result cache; a result larger
+# than this is not cached at all
+result_cache_bytes = 8 * 1024 * 1024
+# the list orders that sort can set, stored as the index in sort_modes in
+# state for row 0, each followed by id to break ties and each with an index.
+# Paused ideas hold the times elapsed since added and probed rather than
+# timestamps so age and idle reverse them to list the oldest first.
+sort_modes = ["name", "age", "idle", "status"]
+sort_orders = {
+    "name": "state, name, status",
+    "age": "state, CASE WHEN state = 1 THEN added ELSE -added END",
+    "idle": "state, CASE WHEN state = 1 THEN probed ELSE -probed END",
+    "status": "state, status, name",
+}
+# ideas other than row 0 that match the find pattern and the shown statuses
+view_where = """\
+i.id > 0
+            AND (:like IS NULL OR i.name LIKE :like OR i.content LIKE :like)
+            AND (:statuses = '[]' OR i.status IN (SELECT value FROM json_each(:statuses)))"""
+# repositioning an idea shifts every later position by one, which rewrites
+# each of those rows twice and moves it in the b-tree at about three times the
+# cost per row of a rebuild, so once the positions to shift pass this share of
+# the view the positions are rebuilt instead
+shift_share = 0.3
+# databases written by earlier versions store this before the pattern
+legacy_find_prefix = "name or content LIKE "
+# stored in PRAGMA user_version once migrate has brought the schema up to date;
+# bump it when migrate gains a step so that existing databases run it
+schema_version = 4
+# what happened to an idea, stored as the index in event_kinds in idea_events
+event_kinds = ["added", "reviewed", "edited", "status", "paused", "activated"]
+# events older than this many days are rolled up into monthly counts per idea
+event_retention_days = 365
+# commands that only read and so open the database read-only when its schema
+# is current; find only reads with --fuzzy since it otherwise keeps the pattern
+read_only_commands = [
+    "list",
+    "l",
+    "info",
+    "i",
+    "stats",
+    "due",
+    "dupes",
+    "related",
+    "history",
+    "tags",
+]
+
+
+class ConflictError(Exception):
+    """Raised when an idea was changed or deleted by another session."""
+
+
+def is_busy(e: sqlite3.OperationalError) -> bool:
+    msg = str(e)
+    return "locked" in msg or "busy" in msg
+
+
+class Idea(NamedTuple):
+    """An idea as shown by info and edited by edit."""
+
+    id: int
+    name: str
+    status: int
+    state: int
+    added: int
+    probed: int
+    content: str
+
+
+class DueIdea(NamedTuple):
+    """An idea listed by due with the seconds it is late and why it is due."""
+
+    id: int
+    name: str
+    status: int
+    state: int
+    added: int
+    probed: int
+    late: int
+    overdue: int
+    idle: int
+
+
+class IdeaRow:
+    """
+    A row of the idea list. With __slots__ a row costs about as much as the
+    tuple it is built from, so streaming large views stays lean.
+    """
+
+    __slots__ = ("id", "name", "status", "state", "added", "probed", "position")
+
+    def __init__(self, id, name, status, state, added, probed, position):
+        self.id = id
+        self.name = name
+        self.status = status
+        self.state = state
+        self.added = added
+        self.probed = probed
+        self.position = position
+
+    def __iter__(self):
+        return iter(
+            (
+                self.id,
+                self.name,
+                self.status,
+                self.state,
+                self.added,
+                self.probed,
+                self.position,
+            )
+        )
+
+
+def _result_size(rows) -> int:
+    """Approximate the bytes held by a list of rows or a single row."""
+    if isinstance(rows, tuple):
+        return sys.getsizeof(rows) + sum(sys.getsizeof(v) for v in rows)
+    return sys.getsizeof(rows) + sum(_result_size(row) for row in rows)
+
+
+class ResultCache:
+    """
+    Results of read statements keyed by (statement, parameters, view settings)
+    and valid while the data_version they were read at is current. The least
+    recently used entries are evicted to keep the total under max_bytes.
+    """
+
+    # returned by get for a key that is not cached since None is a valid result
+    missing = object()
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (result, size)
+        self.size = 0
+        self.version = None
+        # bumped by clear so that a result read before a write is not stored after it
+        self.generation = 0
+
+    def validate(self, version: int):
+        """Drop every entry if version differs from the one they were read at."""
+        if version != self.version:
+            self.clear()
+            self.version = version
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+        self.generation += 1
+
+    def get(self, key):
+        """The result for key, or missing, marking it as recently used."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return self.missing
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, result, size: int):
+        if size > self.max_bytes:
+            return
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.size -= old[1]
+        self.entries[key] = (result, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.size -= evicted
+
+
+def _sort_key(values) -> Tuple:
+    """Make values compare as sqlite orders them: NULL, then numbers, then text."""
+    return tuple(
+        (0, 0) if v is None else (1, v) if isinstance(v, (int, float)) else (2, v)
+        for v in values
+    )
+
+
+def _in_order(keys: List[Optional[Tuple]]) -> bool:
+    """Whether the keys, skipping None for a missing neighbor, strictly rise."""
+    keys = [key for key in keys if key is not None]
+    return all(a < b for a, b in zip(keys, keys[1:]))
+
+
+def _ids_param(idea_ids: List[int]) -> str:
+    """Pass a list of ids or positions as one parameter for json_each."""
+    return json.dumps(idea_ids)
+
+
+def content_hash(name: Optional[str], content: Optional[str]) -> bytes:
+    """A 16 byte digest of name and content, stored in the hash column."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update((name or "").encode())
+    digest.update(b"\0")
+    digest.update((content or "").encode())
+    return digest.digest()
+
+
+class TextIndex(NamedTuple):
+    """What the similarity indexes keep for the name and content of an idea."""
+
+    signature: bytes
+    terms: Dict[str, int]
+
+
+def text_index(name: Optional[str], content: Optional[str]) -> TextIndex:
+    return TextIndex(minhash.signature(name, content), tfidf.term_counts(name, content))
+
+
+class IdeaStore:
+    """
+    Owns the connection and every statement used to read and write ideas. Each
+    statement is a fixed string with named parameters, including those taking a
+    variable number of ids, which are passed as a JSON array and read with
+    json_each, so the connection's statement cache prepares each one once per
+    process and values are never formatted into SQL.
+    """
+
+    order_by = {mode: f"{order}, i.id" for mode, order in sort_orders.items()}
+
+    select_settings_sql = "SELECT content, status, state FROM ideas WHERE id = 0"
+    set_find_sql = "UPDATE ideas SET content = :content WHERE id = 0"
+    set_show_sql = "UPDATE ideas SET status = :status WHERE id = 0"
+    set_sort_sql = "UPDATE ideas SET state = :state WHERE id = 0"
+
+    clear_positions_sql = "DELETE FROM idea_positions"
+    # one statement for each sort mode
+    fill_positions_sql = {
+        mode: f"""\
+        INSERT INTO idea_positions (position, id)
+        SELECT ROW_NUMBER() OVER (ORDER BY {order}), i.id
+        FROM ideas AS i
+        WHERE {view_where}"""
+        for mode, order in order_by.items()
+    }
+    view_key_sql = {
+        mode: f"""\
+        SELECT {order} FROM ideas AS i
+        WHERE i.id = :id AND {view_where}"""
+        for mode, order in order_by.items()
+    }
+    key_at_sql = {
+        mode: f"""\
+        SELECT {order}
+        FROM idea_positions AS p JOIN ideas AS i ON i.id = p.id
+        WHERE p.position = ?"""
+        for mode, order in order_by.items()
+    }
+    delete_position_sql = "DELETE FROM idea_positions WHERE position = ?"
+    shift_out_sql = (
+        "UPDATE idea_positions SET position = -(position + ?) WHERE position >= ?"
+    )
+    shift_back_sql = "UPDATE idea_positions SET position = -position WHERE position < 0"
+    max_position_sql = "SELECT COALESCE(MAX(position), 0) FROM idea_positions"
+    # changes whenever another connection commits a change to the database
+    data_version_sql = "PRAGMA data_version"
+    user_version_sql = "PRAGMA user_version"
+    insert_position_sql = "INSERT INTO idea_positions (position, id) VALUES (?, ?)"
+    ids_at_sql = """\
+        SELECT position, id FROM idea_positions
+        WHERE position IN (SELECT value FROM json_each(?))"""
+    positions_of_sql = """\
+        SELECT id, position FROM idea_positions
+        WHERE id IN (SELECT value FROM json_each(?))"""
+
+    list_rows_sql = """\
+SELECT i.id, i.name, i.status, i.state, i.added, i.probed, p.position
+FROM idea_positions AS p JOIN ideas AS i ON i.id = p.id
+ORDER BY p.position"""
+    select_idea_sql = """\
+        SELECT id, name, status, state, added, probed, content, hash, version
+        FROM ideas WHERE id = ?"""
+    insert_idea_sql = """\
+        INSERT INTO ideas (name, content, status, state, added, probed, hash)
+        VALUES (:name, :content, :status, :state, :added, :probed, :hash)"""
+    delete_idea_sql = "DELETE FROM ideas WHERE id = ?"
+    select_status_changes_sql = """\
+        SELECT id FROM ideas
+        WHERE id IN (SELECT value FROM json_each(:ids)) AND status != :status"""
+    # paused ideas keep the time since probed rather than a timestamp
+    set_status_sql = """\
+        UPDATE ideas
+        SET status = ?, probed = CASE WHEN state = 1 THEN ? ELSE 0 END,
+            version = version + 1
+        WHERE id = ?"""
+    select_pause_sql = """\
+        SELECT id, state, added, probed FROM ideas
+        WHERE id IN (SELECT value FROM json_each(?))"""
+    set_pause_sql = """\
+        UPDATE ideas SET state = ?, added = ?, probed = ?, version = version + 1
+        WHERE id = ?"""
+    # None leaves a column as it is so that one statement serves every update
+    update_idea_sql = """\
+        UPDATE ideas
+        SET name = COALESCE(:name, name),
+            content = COALESCE(:content, content),
+            hash = COALESCE(:hash, hash),
+            status = COALESCE(:status, status),
+            state = COALESCE(:state, state),
+            added = COALESCE(:added, added),
+            probed = :probed,
+            version = version + 1
+        WHERE id = :id AND version = :version"""
+    review_sql = """\
+        UPDATE ideas
+        SET probed = CASE WHEN state = 1 THEN ? ELSE 0 END, version = version + 1
+        WHERE id = ?"""
+    # :added_cutoffs is a JSON array of the cutoff for each status; the CROSS
+    # JOIN keeps json_each outermost so each cutoff is a range on
+    # ideas_state_status_added
+    due_sql = """\
+WITH due AS (
+    SELECT i.id, cut.value - i.added AS late, 1 AS overdue, 0 AS idle
+    FROM json_each(:added_cutoffs) AS cut CROSS JOIN ideas AS i
+    WHERE i.state = 1 AND i.status = cut.key AND i.added <= cut.value AND i.id > 0
+    UNION ALL
+    SELECT id, :probed_cutoff - probed, 0, 1 FROM ideas
+    WHERE state = 1 AND probed <= :probed_cutoff AND id > 0
+)
+SELECT i.id, i.name, i.status, i.state, i.added, i.probed,
+    MAX(due.late) AS late, MAX(due.overdue), MAX(due.idle)
+FROM due JOIN ideas AS i ON i.id = due.id
+GROUP BY i.id
+ORDER BY late DESC"""
+    counts_sql = "SELECT status, state, n FROM idea_counts ORDER BY status, state"
+    total_sql = "SELECT COALESCE(SUM(n), 0) FROM idea_counts"
+    added_days_sql = "SELECT status, day, n FROM idea_added_days"
+    # answered from ideas_hash without reading name or content; row 0 has no hash
+    hashes_sql = "SELECT id, hash FROM ideas WHERE hash IS NOT NULL"
+
+    insert_signature_sql = (
+        "INSERT OR REPLACE INTO idea_minhash (id, signature) VALUES (?, ?)"
+    )
+    clear_buckets_sql = "DELETE FROM idea_lsh WHERE id = ?"
+    insert_bucket_sql = "INSERT INTO idea_lsh (band, bucket, id) VALUES (?, ?, ?)"
+    # :buckets is a JSON array of the bucket of each band
+    bucket_mates_sql = """\
+        SELECT DISTINCT l.id, m.signature
+        FROM json_each(:buckets) AS b CROSS JOIN idea_lsh AS l
+        JOIN idea_minhash AS m ON m.id = l.id
+        WHERE l.band = b.key AND l.bucket = b.value AND l.id != :id"""
+    candidate_pairs_sql = """\
+        SELECT DISTINCT a.id, b.id
+        FROM idea_lsh AS a JOIN idea_lsh AS b
+        ON b.band = a.band AND b.bucket = a.bucket AND b.id > a.id"""
+    select_signatures_sql = """\
+        SELECT id, signature FROM idea_minhash
+        WHERE id IN (SELECT value FROM json_each(?))"""
+    clear_terms_sql = "DELETE FROM idea_terms WHERE id = ?"
+    insert_term_sql = "INSERT INTO idea_terms (term, id, n) VALUES (?, ?, ?)"
+    query_terms_sql = """\
+        SELECT t.term, t.n, d.df
+        FROM idea_terms AS t JOIN idea_term_df AS d ON d.term = t.term
+        WHERE t.id = ?"""
+    # every term of the ideas that share one of :terms with idea :id
+    related_postings_sql = """\
+        WITH candidates AS (
+            SELECT DISTINCT id FROM idea_terms
+            WHERE term IN (SELECT value FROM json_each(:terms)) AND id != :id
+        )
+        SELECT t.id, t.term, t.n, d.df
+        FROM candidates AS c CROSS JOIN idea_terms AS t
+        JOIN idea_term_df AS d ON d.term = t.term
+        WHERE t.id = c.id"""
+    new_terms_sql = """\
+        SELECT value FROM json_each(?)
+        WHERE NOT EXISTS (SELECT 1 FROM term_trigrams WHERE term = value)"""
+    insert_term_trigram_sql = (
+        "INSERT OR IGNORE INTO term_trigrams (trigram, term) VALUES (?, ?)"
+    )
+    # the words sharing a trigram with a word of the pattern and how many they share
+    shared_trigrams_sql = """\
+        SELECT tt.term, COUNT(*)
+        FROM json_each(?) AS q CROSS JOIN term_trigrams AS tt
+        WHERE tt.trigram = q.value
+        GROUP BY tt.term"""
+    ideas_with_terms_sql = """\
+        SELECT t.id, t.term
+        FROM json_each(?) AS q CROSS JOIN idea_terms AS t
+        WHERE t.term = q.value"""
+    select_rows_sql = """\
+        SELECT id, name, status, state, added, probed FROM ideas
+        WHERE id IN (SELECT value FROM json_each(?))"""
+    insert_event_sql = "INSERT INTO idea_events (idea_id, ts, kind) VALUES (?, ?, ?)"
+    oldest_event_sql = "SELECT MIN(ts) FROM idea_events"
+    # months are counted from year 0 so that they are small integers that sort
+    roll_up_events_sql = """\
+        INSERT INTO idea_event_months (idea_id, month, kind, n)
+        SELECT idea_id,
+            CAST(strftime('%Y', ts, 'unixepoch') AS INTEGER) * 12
+                + CAST(strftime('%m', ts, 'unixepoch') AS INTEGER) - 1 AS month,
+            kind, COUNT(*)
+        FROM idea_events WHERE ts < ?
+        GROUP BY idea_id, month, kind
+        ON CONFLICT (idea_id, month, kind) DO UPDATE SET n = n + excluded.n"""
+    delete_events_sql = "DELETE FROM idea_events WHERE ts < ?"
+    idea_events_sql = """\
+        SELECT ts, kind FROM idea_events
+        WHERE idea_id = ? AND ts >= ?
+        ORDER BY ts DESC"""
+    idea_event_months_sql = """\
+        SELECT month, kind, n FROM idea_event_months
+        WHERE idea_id = ?
+        ORDER BY month DESC, kind"""
+    # days by the local date, as history labels them
+    activity_sql = """\
+        SELECT date(ts, 'unixepoch', 'localtime') AS day, kind, COUNT(*)
+        FROM idea_events
+        WHERE ts >= ?
+        GROUP BY day, kind
+        ORDER BY day DESC"""
+    # pairs of a tag and an idea id for the bitmaps of _cached_bitmaps
+    tag_ideas_sql = """\
+        SELECT t.name, it.idea_id
+        FROM tags AS t JOIN idea_tags AS it ON it.tag_id = t.id"""
+    all_ideas_sql = "SELECT 0, id FROM ideas WHERE id > 0"
+    insert_tag_sql = "INSERT OR IGNORE INTO tags (name) VALUES (?)"
+    tag_idea_sql = """\
+        INSERT OR IGNORE INTO idea_tags (tag_id, idea_id)
+        SELECT id, ? FROM tags WHERE name = ?"""
+    untag_idea_sql = """\
+        DELETE FROM idea_tags
+        WHERE idea_id = ? AND tag_id = (SELECT id FROM tags WHERE name = ?)"""
+    idea_tag_names_sql = """\
+        SELECT t.name FROM idea_tags AS it JOIN tags AS t ON t.id = it.tag_id
+        WHERE it.idea_id = ?
+        ORDER BY t.name"""
+    tag_counts_sql = """\
+        SELECT t.name, COUNT(*) FROM tags AS t JOIN idea_tags AS it ON it.tag_id = t.id
+        GROUP BY t.id
+        ORDER BY t.name"""
+    # the CROSS JOIN keeps json_each outermost so each id is a lookup in the
+    # unique index on idea_positions.id
+    rows_in_view_sql = """\
+SELECT i.id, i.name, i.status, i.state, i.added, i.probed, p.position
+FROM json_each(?) AS s CROSS JOIN idea_positions AS p JOIN ideas AS i ON i.id = p.id
+WHERE p.id = s.value
+ORDER BY p.position"""
+
+    @classmethod
+    def statement_count(cls) -> int:
+        """How many *_sql statements there are, one for each sort of a dict."""
+        return sum(
+            len(sql) if isinstance(sql, dict) else 1
+            for name, sql in vars(cls).items()
+            if name.endswith("_sql")
+        )
+
+    def __init__(self, path: str, read_only: bool = False):
+        # check_same_thread=False lets the async shell run queries in its worker
+        # thread; all access still happens from one thread at a time.
+        self.conn = sqlite3.connect(
+            f"file:{path}?mode=ro" if read_only else path,
+            timeout=busy_timeout,
+            check_same_thread=False,
+            cached_statements=self.statement_count() + statement_cache_headroom,
+            uri=read_only,
+        )
+        self.conn.create_function("REGEXP", 2, regexp)
+        if not read_only:
+            # takes effect for a new file, before WAL mode writes its header;
+            # maintenance switches older files over with a VACUUM
+            self.conn.execute(f"PRAGMA auto_vacuum = {maintenance.incremental}")
+            # WAL lets other sessions keep reading while one of them writes
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        self.cursor = self.conn.cursor()
+        self.cache = ResultCache(result_cache_bytes)
+        # held by transactions so that the working set is not flushed mid-way
+        self.lock = threading.RLock()
+        # the redo log of the working set that transactions are logged to
+        self.redo = None
+        # how many transactions enclose the current statement
+        self.depth = 0
+        # the ideas waiting to be repositioned within defer_positions
+        self.deferred = None
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run the enclosed reads and writes as one transaction holding the write lock
+        (BEGIN IMMEDIATE). While another session holds the lock, retry with bounded
+        exponential backoff and then give up by raising sqlite3.OperationalError.
+        Commits on success and rolls back if an exception is raised. Either way
+        the result cache is cleared since data_version does not count the writes
+        of this connection. In memory mode the writes are logged to the redo log
+        before the commit. Within another transaction, e.g., a chunk of batch,
+        this is a savepoint of that transaction instead.
+        """
+        with self.lock:
+            if self.depth:
+                with self._savepoint():
+                    yield
+                return
+            delay = busy_backoff
+            for attempt in range(busy_retries):
+                try:
+                    self.conn.execute("BEGIN IMMEDIATE")
+                    break
+                except sqlite3.OperationalError as e:
+                    if not is_busy(e) or attempt == busy_retries - 1:
+                        raise
+                    time.sleep(delay + random.uniform(0, delay))
+                    delay = min(2 * delay, busy_backoff_max)
+            if self.redo is not None:
+                self.redo.begin()
+            self.depth += 1
+            try:
+                yield
+            except BaseException:
+                self.conn.rollback()
+                if self.redo is not None:
+                    self.redo.rollback()
+                raise
+            finally:
+                self.depth -= 1
+                self.cache.clear()
+            if self.redo is not None:
+                self.redo.commit()
+            self.conn.commit()
+
+    @contextmanager
+    def _savepoint(self):
+        """
+        A transaction within a transaction: its writes are undone if an exception
+        is raised while those made before it are kept.
+        """
+        self.conn.execute("SAVEPOINT nested")
+        mark = self.redo.savepoint() if self.redo is not None else 0
+        self.depth += 1
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK TO nested")
+            self.conn.execute("RELEASE nested")
+            if self.redo is not None:
+                self.redo.rollback_to(mark)
+            raise
+        finally:
+            self.depth -= 1
+        self.conn.execute("RELEASE nested")
+
+    def _one(self, sql: str, params=()) -> Optional[Tuple]:
+        return self.cursor.execute(sql, params).fetchone()
+
+    def _all(self, sql: str, params=()) -> List[Tuple]:
+        return self.cursor.execute(sql, params).fetchall()
+
+    def _cache_key(self, sql: str, params=(), view: bool = False):
+        """
+        The cache key for sql and params, plus the view settings when the result
+        depends on them, or None if the cache cannot be used: inside a
+        transaction reads must see its own uncommitted writes.
+        """
+        if self.conn.in_transaction:
+            return None
+        self.cache.validate(self.data_version())
+        return sql, tuple(params), self.settings() if view else None
+
+    def _cached_one(self, sql: str, params=(), view: bool = False) -> Optional[Tuple]:
+        key = self._cache_key(sql, params, view)
+        if key is None:
+            return self._one(sql, params)
+        row = self.cache.get(key)
+        if row is self.cache.missing:
+            row = self._one(sql, params)
+            self.cache.put(key, row, _result_size(row) if row else 0)
+        return row
+
+    def _cached_all(self, sql: str, params=(), view: bool = False) -> List[Tuple]:
+        key = self._cache_key(sql, params, view)
+        if key is None:
+            return self._all(sql, params)
+        rows = self.cache.get(key)
+        if rows is self.cache.missing:
+            rows = self._all(sql, params)
+            self.cache.put(key, rows, _result_size(rows))
+        return rows
+
+    def _cached_bitmaps(self, sql: str) -> Dict:
+        """
+        The rows of sql, pairs of a key and an idea id, as the bitmap of the ids
+        for each key, cached like other results.
+        """
+        key = self._cache_key(sql)
+        bitmaps = self.cache.missing if key is None else self.cache.get(key)
+        if bitmaps is self.cache.missing:
+            groups = {}
+            for group, idea_id in self._all(sql):
+                groups.setdefault(group, []).append(idea_id)
+            bitmaps = {group: bitmap.from_ids(ids) for group, ids in groups.items()}
+            if key is not None:
+                self.cache.put(
+                    key, bitmaps, sum(sys.getsizeof(b) for b in bitmaps.values())
+                )
+        return bitmaps
+
+    # settings in row 0
+
+    def settings(self) -> Tuple[Optional[str], int, str]:
+        """The find pattern, encoded show setting and sort mode from row 0."""
+        content, status, state = self._cached_one(self.select_settings_sql)
+        if content:
+            content = content.removeprefix(legacy_find_prefix)
+        sort = sort_modes[state] if state in range(len(sort_modes)) else "name"
+        return content or None, status, sort
+
+    def view(self) -> Tuple[Dict[str, Optional[str]], str]:
+        """The parameters of view_where and the sort mode for the current settings."""
+        pattern, status, sort = self.settings()
+        params = {
+            "like": f"%{pattern}%" if pattern else None,
+            "statuses": _ids_param(
+                pos_from_show_binaries(decode_view_settings(status))
+            ),
+        }
+        return params, sort
+
+    def set_find(self, pattern: Optional[str]):
+        with self.transaction():
+            self.cursor.execute(self.set_find_sql, {"content": pattern})
+            self.rebuild_positions()
+
+    def set_show(self, encoded: int):
+        with self.transaction():
+            self.cursor.execute(self.set_show_sql, {"status": encoded})
+            self.rebuild_positions()
+
+    def set_sort(self, sort: str):
+        with self.transaction():
+            self.cursor.execute(self.set_sort_sql, {"state": sort_modes.index(sort)})
+            self.rebuild_positions()
+
+    # positions
+
+    def rebuild_positions(self):
+        """Renumber idea_positions from scratch. Call within a transaction."""
+        if self.deferred is not None:
+            self.deferred.clear()
+        params, sort = self.view()
+        self.cursor.execute(self.clear_positions_sql)
+        self.cursor.execute(self.fill_positions_sql[sort], params)
+
+    def _key_at(self, position: int, sort: str) -> Optional[Tuple]:
+        row = self._one(self.key_at_sql[sort], (position,))
+        return _sort_key(row) if row else None
+
+    def _shift_positions(self, start: int, delta: int):
+        """Add delta to every position >= start, in two steps to keep positions unique."""
+        self.cursor.execute(self.shift_out_sql, (delta, start))
+        self.cursor.execute(self.shift_back_sql)
+
+    def _find_position(self, key: Tuple, count: int, sort: str) -> int:
+        """Binary search for the first of count positions whose key is greater than key."""
+        lo, hi = 1, count + 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if key < self._key_at(mid, sort):
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    @contextmanager
+    def defer_positions(self):
+        """
+        Within a transaction, collect the ideas to reposition rather than moving
+        each as it is written, and bring idea_positions up to date only when a
+        position is next read or the block ends, so that a run of writes costs
+        one rebuild rather than shifting the positions for each.
+        """
+        self.deferred = set()
+        try:
+            yield
+            self._settle_positions()
+        finally:
+            self.deferred = None
+
+    def _settle_positions(self):
+        """Reposition the ideas collected by defer_positions."""
+        if self.deferred:
+            idea_ids = [*self.deferred]
+            self.deferred.clear()
+            self._reposition(idea_ids)
+
+    def reposition(self, idea_ids: List[int]):
+        """
+        Bring idea_positions up to date after the ideas with idea_ids were inserted,
+        updated or deleted. Call within the transaction that changed them.
+        """
+        if self.deferred is not None:
+            self.deferred.update(idea_ids)
+            return
+        self._reposition(idea_ids)
+
+    def _in_place(
+        self, idea_ids: List[int], keys: Dict, positions: Dict[int, int], sort: str
+    ) -> Set[int]:
+        """
+        Those of idea_ids that can stay where they are: ideas out of the view
+        with no position and each run of them at consecutive positions whose
+        keys are still in order and between those of the ideas on either side,
+        as when a change leaves the sort key alone. The others are then removed
+        and placed again, which leaves the rest of the view in order.
+        """
+        in_place = {
+            idea_id
+            for idea_id in idea_ids
+            if idea_id not in positions and keys[idea_id] is None
+        }
+        id_at = {position: idea_id for idea_id, position in positions.items()}
+        run = []
+        for position in sorted(id_at) + [None]:
+            if run and position == run[-1] + 1:
+                run.append(position)
+                continue
+            if run:
+                run_keys = [keys[id_at[p]] for p in run]
+                bounds = [
+                    self._key_at(run[0] - 1, sort),
+                    self._key_at(run[-1] + 1, sort),
+                ]
+                if None not in run_keys and _in_order(
+                    [bounds[0]] + run_keys + [bounds[1]]
+                ):
+                    in_place.update(id_at[p] for p in run)
+            run = [position]
+        return in_place
+
+    def _reposition(self, idea_ids: List[int]):
+        """
+        Move the ideas that are out of place, all removed before any is placed
+        again since the binary search for a place needs the other positions to
+        be in order, or rebuild once the positions this shifts pass shift_share
+        of the view.
+        """
+        params, sort = self.view()
+        keys = {}
+        for idea_id in idea_ids:
+            row = self._one(self.view_key_sql[sort], {**params, "id": idea_id})
+            keys[idea_id] = _sort_key(row) if row else None
+        positions = dict(self._all(self.positions_of_sql, (_ids_param(idea_ids),)))
+        in_place = self._in_place(idea_ids, keys, positions, sort)
+        moving = [idea_id for idea_id in idea_ids if idea_id not in in_place]
+        if not moving:
+            return
+
+        count = self._one(self.max_position_sql)[0]
+        budget = shift_share * count
+        removed = sorted(
+            (positions[id] for id in moving if id in positions), reverse=True
+        )
+        # removing the last first, each shifts the positions after it
+        shifted = sum(count - i - position for i, position in enumerate(removed))
+        if shifted > budget:
+            self.rebuild_positions()
+            return
+        for position in removed:
+            self.cursor.execute(self.delete_position_sql, (position,))
+            self._shift_positions(position + 1, -1)
+        count -= len(removed)
+        for idea_id in moving:
+            key = keys[idea_id]
+            if key is None:
+                continue
+            position = self._find_position(key, count, sort)
+            shifted += count + 1 - position
+            if shifted > budget:
+                self.rebuild_positions()
+                return
+            self._shift_positions(position, 1)
+            self.cursor.execute(self.insert_position_sql, (position, idea_id))
+            count += 1
+
+    def data_version(self) -> int:
+        return self._one(self.data_version_sql)[0]
+
+    def user_version(self) -> int:
+        """The schema_version the database was last migrated to."""
+        return self._one(self.user_version_sql)[0]
+
+    def view_count(self) -> int:
+        self._settle_positions()
+        return self._cached_one(self.max_position_sql)[0]
+
+    def ids_at(self, positions: List[int]) -> Dict[int, int]:
+        """Map those of positions that are in the view to their ids."""
+        self._settle_positions()
+        return dict(self._all(self.ids_at_sql, (_ids_param(positions),)))
+
+    def positions_of(self, idea_ids: List[int]) -> Dict[int, int]:
+        """Map those of idea_ids that are in the view to their positions."""
+        self._settle_positions()
+        return dict(self._all(self.positions_of_sql, (_ids_param(idea_ids),)))
+
+    # reads
+
+    def list_rows(self) -> Iterator[IdeaRow]:
+        """
+        Stream the view in list order, fetch_size rows at a time. A view read to
+        the end is cached unless it is larger than the whole cache.
+        """
+        self._settle_positions()
+        key = self._cache_key(self.list_rows_sql, view=True)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not self.cache.missing:
+                for row in cached:
+                    yield IdeaRow(*row)
+                return
+        generation = self.cache.generation
+        # nothing is kept for the cache when it cannot be used
+        kept, size = ([] if key is not None else None), 0
+        # a cursor of its own so that queries made while streaming do not reset it
+        cursor = self.conn.execute(self.list_rows_sql)
+        try:
+            while rows := cursor.fetchmany(fetch_size):
+                if kept is not None:
+                    kept.extend(rows)
+                    size += _result_size(rows)
+                    if size > self.cache.max_bytes:
+                        kept = None
+                for row in rows:
+                    yield IdeaRow(*row)
+        finally:
+            # ends the read, which would otherwise keep seeing the data as it
+            # was if the stream is abandoned, e.g., when a render is cancelled
+            cursor.close()
+        if kept is not None and generation == self.cache.generation:
+            self.cache.put(key, kept, size)
+
+    def tagged(self, include: List[str], exclude: List[str]) -> int:
+        """
+        The bitmap of the ideas with every tag of include and none of exclude,
+        worked out from the cached bitmap of each tag without a query once those
+        are read. With no tags to include, every idea is a candidate.
+        """
+        tags = self._cached_bitmaps(self.tag_ideas_sql)
+        return bitmap.select(
+            [tags.get(tag, 0) for tag in include]
+            or [self._cached_bitmaps(self.all_ideas_sql).get(0, 0)],
+            [tags.get(tag, 0) for tag in exclude],
+        )
+
+    def rows_in_view(self, idea_ids: List[int]) -> Iterator[IdeaRow]:
+        """Stream those of idea_ids in the view in list order, fetch_size rows at a time."""
+        self._settle_positions()
+        cursor = self.conn.execute(self.rows_in_view_sql, (_ids_param(idea_ids),))
+        try:
+            while rows := cursor.fetchmany(fetch_size):
+                for row in rows:
+                    yield IdeaRow(*row)
+        finally:
+            cursor.close()
+
+    def idea_tags(self, idea_id: int) -> List[str]:
+        return [
+            name for (name,) in self._cached_all(self.idea_tag_names_sql, (idea_id,))
+        ]
+
+    def tag_counts(self) -> List[Tuple[str, int]]:
+        return self._cached_all(self.tag_counts_sql)
+
+    def read(self, idea_id: int) -> Optional[Tuple]:
+        """The columns of snapshot_columns for idea_id or None if it does not exist."""
+        return self._cached_one(self.select_idea_sql, (idea_id,))
+
+    def due_ideas(self, added_cutoffs: List[int], probed_cutoff: int) -> List[DueIdea]:
+        rows = self._all(
+            self.due_sql,
+            {
+                "added_cutoffs": json.dumps(added_cutoffs),
+                "probed_cutoff": probed_cutoff,
+            },
+        )
+        return [DueIdea(*row) for row in rows]
+
+    def counts(self) -> List[Tuple]:
+        return self._cached_all(self.counts_sql)
+
+    def total(self) -> int:
+        return self._cached_one(self.total_sql)[0]
+
+    def added_days(self) -> List[Tuple]:
+        return self._cached_all(self.added_days_sql)
+
+    def hashes(self) -> Dict[int, bytes]:
+        return dict(self._all(self.hashes_sql))
+
+    def bucket_mates(self, idea_id: int, sig: bytes) -> List[Tuple[int, bytes]]:
+        """(id, signature) of the other ideas sharing a bucket with sig."""
+        buckets = minhash.band_buckets(sig)
+        return self._all(
+            self.bucket_mates_sql, {"buckets": json.dumps(buckets), "id": idea_id}
+        )
+
+    def related(self, idea_id: int, k: int) -> List[Tuple[int, float]]:
+        """The k ideas most similar to idea_id by TF-IDF cosine similarity."""
+        query = {
+            term: (n, df) for term, n, df in self._all(self.query_terms_sql, (idea_id,))
+        }
+        total = self.total()
+        postings = self._all(
+            self.related_postings_sql,
+            {
+                "terms": json.dumps(tfidf.candidate_terms(query, total)),
+                "id": idea_id,
+            },
+        )
+        return tfidf.top_k(query, postings, total, k)
+
+    def similar_terms(self, word: str, threshold: float) -> Dict[str, float]:
+        """The words of the vocabulary whose trigrams are like those of word."""
+        word_trigrams = trigram.trigrams(word)
+        res = {}
+        for term, shared in self._all(
+            self.shared_trigrams_sql, (json.dumps([*word_trigrams]),)
+        ):
+            score = trigram.similarity(
+                shared, len(word_trigrams), len(trigram.trigrams(term))
+            )
+            if score >= threshold:
+                res[term] = score
+        return res
+
+    def ideas_with_terms(self, terms: List[str]) -> List[Tuple[int, str]]:
+        return self._all(self.ideas_with_terms_sql, (json.dumps(terms),))
+
+    def candidate_pairs(self) -> List[Tuple[int, int]]:
+        return self._all(self.candidate_pairs_sql)
+
+    def signatures(self, idea_ids: List[int]) -> Dict[int, bytes]:
+        return dict(self._all(self.select_signatures_sql, (_ids_param(idea_ids),)))
+
+    def rows(self, idea_ids: List[int]) -> Dict[int, Tuple]:
+        """(id, name, status, state, added, probed) of idea_ids by id."""
+        return {
+            row[0]: row
+            for row in self._all(self.select_rows_sql, (_ids_param(idea_ids),))
+        }
+
+    def events(self, idea_id: int, since: int) -> List[Tuple[int, int]]:
+        """(ts, kind) for the events of idea_id since since, newest first."""
+        return self._all(self.idea_events_sql, (idea_id, since))
+
+    def event_months(self, idea_id: int) -> List[Tuple[int, int, int]]:
+        """(month, kind, count) for the rolled up events of idea_id, newest first."""
+        return self._all(self.idea_event_months_sql, (idea_id,))
+
+    def activity(self, since: int) -> List[Tuple[str, int, int]]:
+        """
+        ("YYYY-MM-DD", kind, count) for the events since since, by local date,
+        newest day first.
+        """
+        return self._all(self.activity_sql, (since,))
+
+    # writes
+
+    def record_events(self, idea_ids: List[int], now: int, kind: int):
+        """
+        Append an event of kind at now for each of idea_ids. Call within a
+        transaction. Once a day's worth of events is past event_retention_days,
+        those older than that are rolled up into monthly counts.
+        """
+        self.cursor.executemany(
+            self.insert_event_sql, [(id, now, kind) for id in idea_ids]
+        )
+        cutoff = now - event_retention_days * 86400
+        oldest = self._one(self.oldest_event_sql)[0]
+        if oldest is not None and oldest < cutoff - 86400:
+            self.cursor.execute(self.roll_up_events_sql, (cutoff,))
+            self.cursor.execute(self.delete_events_sql, (cutoff,))
+
+    def index_signature(self, idea_id: int, sig: bytes):
+        """Store sig for idea_id and file it in the bucket of each band."""
+        self.cursor.execute(self.insert_signature_sql, (idea_id, sig))
+        self.cursor.execute(self.clear_buckets_sql, (idea_id,))
+        self.cursor.executemany(
+            self.insert_bucket_sql,
+            [
+                (band, bucket, idea_id)
+                for band, bucket in enumerate(minhash.band_buckets(sig))
+            ],
+        )
+
+    def index_terms(self, idea_id: int, terms: Dict[str, int]):
+        """Replace the term counts of idea_id with terms."""
+        self.cursor.execute(self.clear_terms_sql, (idea_id,))
+        self.cursor.executemany(
+            self.insert_term_sql, [(term, idea_id, n) for term, n in terms.items()]
+        )
+        self.index_trigrams([*terms])
+
+    def index_trigrams(self, terms: List[str]):
+        """Add the trigrams of those of terms that are new to the vocabulary."""
+        new = self._all(self.new_terms_sql, (json.dumps(terms),))
+        self.cursor.executemany(
+            self.insert_term_trigram_sql,
+            [(tri, term) for (term,) in new for tri in trigram.trigrams(term)],
+        )
+
+    def index_text(self, idea_id: int, text: TextIndex):
+        self.index_signature(idea_id, text.signature)
+        self.index_terms(idea_id, text.terms)
+
+    def insert(self, idea: Dict, text: TextIndex, now: int) -> int:
+        """Insert idea, a dict of the columns of insert_idea, and return its id."""
+        with self.transaction():
+            self.cursor.execute(self.insert_idea_sql, idea)
+            idea_id = self.cursor.lastrowid
+            self.index_text(idea_id, text)
+            self.record_events([idea_id], now, event_kinds.index("added"))
+            self.reposition([idea_id])
+        return idea_id
+
+    def delete(self, idea_ids: List[int]):
+        with self.transaction():
+            self.cursor.executemany(self.delete_idea_sql, [(id,) for id in idea_ids])
+            self.reposition(idea_ids)
+
+    def set_status(self, idea_ids: List[int], status: int, now: int) -> List[int]:
+        """Set status for those of idea_ids whose status differs and return their ids."""
+        with self.transaction():
+            changed = [
+                row[0]
+                for row in self._all(
+                    self.select_status_changes_sql,
+                    {"ids": _ids_param(idea_ids), "status": status},
+                )
+            ]
+            self.cursor.executemany(
+                self.set_status_sql, [(status, now, id) for id in changed]
+            )
+            self.record_events(changed, now, event_kinds.index("status"))
+            self.reposition(changed)
+        return changed
+
+    def toggle_pause(self, idea_ids: List[int], now: int) -> int:
+        # read and write under the same lock so that another session cannot toggle in between
+        with self.transaction():
+            params = [
+                (0 if state == 1 else 1, now - added, now - probed, id)
+                for id, state, added, probed in self._all(
+                    self.select_pause_sql, (_ids_param(idea_ids),)
+                )
+            ]
+            self.cursor.executemany(self.set_pause_sql, params)
+            for state, kind in ((0, "paused"), (1, "activated")):
+                self.record_events(
+                    [id for new, *_, id in params if new == state],
+                    now,
+                    event_kinds.index(kind),
+                )
+            self.reposition([id for *_, id in params])
+        return len(params)
+
+    def update(
+        self, values: Dict, text: Optional[TextIndex] = None, kinds: List[int] = ()
+    ) -> bool:
+        """
+        Apply update_idea with values, a dict of its parameters, reindex its
+        text if given, record an event of each of kinds and reposition the
+        idea. Returns False if the version no longer matched.
+        """
+        with self.transaction():
+            self.cursor.execute(self.update_idea_sql, values)
+            swapped = self.cursor.rowcount == 1
+            if swapped:
+                if text is not None:
+                    self.index_text(values["id"], text)
+                for kind in kinds:
+                    self.record_events([values["id"]], values["probed"], kind)
+                self.reposition([values["id"]])
+        return swapped
+
+    def review(self, idea_ids: List[int], now: int):
+        with self.transaction():
+            self.cursor.executemany(self.review_sql, [(now, id) for id in idea_ids])
+            self.record_events(idea_ids, now, event_kinds.index("reviewed"))
+            self.reposition(idea_ids)
+
+    def tag(self, idea_ids: List[int], names: List[str]) -> int:
+        """Give each of idea_ids each of names and return how many were new."""
+        with self.transaction():
+            self.cursor.executemany(self.insert_tag_sql, [(name,) for name in names])
+            self.cursor.executemany(
+                self.tag_idea_sql, [(id, name) for id in idea_ids for name in names]
+            )
+            return self.cursor.rowcount
+
+    def untag(self, idea_ids: List[int], names: List[str]) -> int:
+        """Take names from each of idea_ids and return how many were removed."""
+        with self.transaction():
+            self.cursor.executemany(
+                self.untag_idea_sql, [(id, name) for id in idea_ids for name in names]
+            )
+            return self.cursor.rowcount
+
+
+def _reads_only(argv: List[str]) -> bool:
+    """Whether the command line runs a single command that only reads."""
+    if len(argv) < 2:
+        return False
+    return argv[1] in read_only_commands or (argv[1] == "find" and "--fuzzy" in argv)
+
+
+def open_store() -> IdeaStore:
+    """
+    Open the database read-only for a command that only reads if its schema is
+    current and no redo log is waiting to be applied, so that starting up
+    writes nothing, and otherwise for reading and writing. With IDEAMEMORY set
+    the commands work on a copy of the database in memory.
+    """
+    if working_set.enabled:
+        os.makedirs(idea_home, exist_ok=True)
+        return IdeaStore(":memory:")
+    if (
+        _reads_only(sys.argv)
+        and os.path.exists(db_path)
+        and not os.path.exists(working_set.redo_path(db_path))
+    ):
+        store = IdeaStore(db_path, read_only=True)
+        if store.user_version() >= schema_version:
+            return store
+        store.conn.close()
+    os.makedirs(idea_home, exist_ok=True)
+    return IdeaStore(db_path)
+
+
+store = open_store()
+working = working_set.WorkingSet(store, db_path) if working_set.enabled else None
+conn = store.conn
+c = store.cursor
+write_transaction = store.transaction
+
+# position -> id of the ideas the last list showed, to check that a position
+# still holds the idea that was shown there
 pos_to_id = {}
+# id -> {column: value} as last read by get_idea_by_position, including version
+snapshots = {}
 
 
 def create_table():
@@ -48,88 +1209,405 @@ def create_table():
             state INTEGER,
             added INTEGER,
             probed INTEGER,
-            id INTEGER PRIMARY KEY
+            id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            hash BLOB
         )"""
     )
+    # add the version column to databases created before it existed
+    columns = [row[1] for row in c.execute("PRAGMA table_info(ideas)")]
+    if "version" not in columns:
+        with write_transaction():
+            c.execute("ALTER TABLE ideas ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+    # likewise the hash column, which is then filled for the existing ideas
+    if "hash" not in columns:
+        with write_transaction():
+            c.execute("ALTER TABLE ideas ADD COLUMN hash BLOB")
+            rows = c.execute("SELECT id, name, content FROM ideas WHERE id > 0")
+            c.executemany(
+                "UPDATE ideas SET hash = ? WHERE id = ?",
+                [
+                    (content_hash(name, content), id)
+                    for id, name, content in rows.fetchall()
+                ],
+            )
 
 
-create_table()
+def create_indexes():
+    """
+    Indexes for the due command's per-status added and probed cutoffs, one
+    covering id and hash for tools that look for changed ideas and one for
+    each sort mode.
+    """
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS ideas_state_status_added ON ideas (state, status, added)"
+    )
+    c.execute("CREATE INDEX IF NOT EXISTS ideas_state_probed ON ideas (state, probed)")
+    c.execute("CREATE INDEX IF NOT EXISTS ideas_hash ON ideas (hash)")
+    # the order of each sort mode, so that rebuilding the positions reads the
+    # ideas in order rather than sorting them
+    for mode, order in sort_orders.items():
+        c.execute(f"CREATE INDEX IF NOT EXISTS ideas_sort_{mode} ON ideas ({order})")
 
 
-def initialize_settings():
-    """Ensure row 0 exists for storing view settings."""
-    c.execute("SELECT COUNT(*) FROM ideas WHERE id = 0")
-    # ts = timestamp()
-    if c.fetchone()[0] == 0:
-        with conn:
-            c.execute(
-                # """INSERT INTO ideas (name, content, status, state, added, probed)
-                #    VALUES ('settings', '', None, None, 0, 0)"""
-                f"""INSERT INTO ideas (name, content, state, status, added, probed, id)
-                   VALUES ('settings', '', {default_state_setting}, {default_status_setting}, 0, 0, 0)"""
-            )
+def create_summary():
+    """
+    Create the summary tables and the triggers that keep them current: counts of
+    ideas per status and state, and for active ideas per status, the number
+    added on each day (added // 86400) from which stats builds age histograms.
+    Existing ideas are counted when the tables are first created.
+    """
+    c.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'idea_counts'"
+    )
+    if c.fetchone()[0]:
+        return
+    with write_transaction():
+        c.execute(
+            """\
+            CREATE TABLE idea_counts (
+                status INTEGER,
+                state INTEGER,
+                n INTEGER NOT NULL,
+                PRIMARY KEY (status, state)
+            ) WITHOUT ROWID"""
+        )
+        c.execute(
+            """\
+            CREATE TABLE idea_added_days (
+                status INTEGER,
+                day INTEGER,
+                n INTEGER NOT NULL,
+                PRIMARY KEY (status, day)
+            ) WITHOUT ROWID"""
+        )
+        add = """\
+            INSERT INTO idea_counts (status, state, n) VALUES (NEW.status, NEW.state, 1)
+                ON CONFLICT (status, state) DO UPDATE SET n = n + 1;
+            INSERT INTO idea_added_days (status, day, n)
+                SELECT NEW.status, NEW.added / 86400, 1 WHERE NEW.state = 1
+                ON CONFLICT (status, day) DO UPDATE SET n = n + 1;"""
+        remove = """\
+            UPDATE idea_counts SET n = n - 1
+                WHERE status = OLD.status AND state = OLD.state;
+            DELETE FROM idea_counts
+                WHERE status = OLD.status AND state = OLD.state AND n <= 0;
+            UPDATE idea_added_days SET n = n - 1
+                WHERE OLD.state = 1 AND status = OLD.status AND day = OLD.added / 86400;
+            DELETE FROM idea_added_days
+                WHERE status = OLD.status AND day = OLD.added / 86400 AND n <= 0;"""
+        c.execute(
+            f"""\
+            CREATE TRIGGER idea_summary_insert AFTER INSERT ON ideas WHEN NEW.id > 0
+            BEGIN
+            {add}
+            END"""
+        )
+        c.execute(
+            f"""\
+            CREATE TRIGGER idea_summary_delete AFTER DELETE ON ideas WHEN OLD.id > 0
+            BEGIN
+            {remove}
+            END"""
+        )
+        c.execute(
+            f"""\
+            CREATE TRIGGER idea_summary_update AFTER UPDATE OF status, state, added ON ideas
+            WHEN OLD.id > 0
+            BEGIN
+            {remove}
+            {add}
+            END"""
+        )
+        c.execute(
+            """\
+            INSERT INTO idea_counts (status, state, n)
+            SELECT status, state, COUNT(*) FROM ideas WHERE id > 0 GROUP BY status, state"""
+        )
+        c.execute(
+            """\
+            INSERT INTO idea_added_days (status, day, n)
+            SELECT status, added / 86400, COUNT(*) FROM ideas
+            WHERE id > 0 AND state = 1 GROUP BY status, added / 86400"""
+        )
 
 
-initialize_settings()
+def create_minhash():
+    """
+    Create the tables for finding near duplicates: the MinHash signature of
+    each idea and, for each band of its signature, the bucket it falls in.
+    Signatures are written along with the ideas and removed by a trigger when
+    an idea is deleted. Existing ideas are indexed when the tables are first
+    created.
+    """
+    c.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'idea_minhash'"
+    )
+    if c.fetchone()[0]:
+        return
+    with write_transaction():
+        c.execute(
+            """\
+            CREATE TABLE idea_minhash (
+                id INTEGER PRIMARY KEY,
+                signature BLOB NOT NULL
+            )"""
+        )
+        c.execute(
+            """\
+            CREATE TABLE idea_lsh (
+                band INTEGER,
+                bucket INTEGER,
+                id INTEGER,
+                PRIMARY KEY (band, bucket, id)
+            ) WITHOUT ROWID"""
+        )
+        c.execute("CREATE INDEX idea_lsh_id ON idea_lsh (id)")
+        c.execute(
+            """\
+            CREATE TRIGGER idea_minhash_delete AFTER DELETE ON ideas
+            BEGIN
+                DELETE FROM idea_minhash WHERE id = OLD.id;
+                DELETE FROM idea_lsh WHERE id = OLD.id;
+            END"""
+        )
+        rows = c.execute("SELECT id, name, content FROM ideas WHERE id > 0").fetchall()
+        for id, name, content in rows:
+            store.index_signature(id, minhash.signature(name, content))
 
 
-def create_view(filter_condition=None):
+def create_terms():
     """
-    Create the 'idea_positions' view, optionally with a filter condition.
+    Create the tables for finding related ideas: the number of times each term
+    occurs in each idea and, kept by triggers, the number of ideas with each
+    term. Weights are applied when querying so that they follow the current
+    document frequencies. Existing ideas are indexed when the tables are first
+    created.
     """
-    # Connect to the database
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
+    c.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'idea_terms'"
+    )
+    if c.fetchone()[0]:
+        return
+    with write_transaction():
+        c.execute(
+            """\
+            CREATE TABLE idea_terms (
+                term TEXT,
+                id INTEGER,
+                n INTEGER NOT NULL,
+                PRIMARY KEY (term, id)
+            ) WITHOUT ROWID"""
+        )
+        # covers reading all the terms of an idea
+        c.execute("CREATE INDEX idea_terms_id ON idea_terms (id, n)")
+        c.execute(
+            """\
+            CREATE TABLE idea_term_df (
+                term TEXT PRIMARY KEY,
+                df INTEGER NOT NULL
+            ) WITHOUT ROWID"""
+        )
+        c.execute(
+            """\
+            CREATE TRIGGER idea_terms_insert AFTER INSERT ON idea_terms
+            BEGIN
+                INSERT INTO idea_term_df (term, df) VALUES (NEW.term, 1)
+                    ON CONFLICT (term) DO UPDATE SET df = df + 1;
+            END"""
+        )
+        c.execute(
+            """\
+            CREATE TRIGGER idea_terms_delete AFTER DELETE ON idea_terms
+            BEGIN
+                UPDATE idea_term_df SET df = df - 1 WHERE term = OLD.term;
+                DELETE FROM idea_term_df WHERE term = OLD.term AND df <= 0;
+            END"""
+        )
+        c.execute(
+            """\
+            CREATE TRIGGER idea_terms_idea_delete AFTER DELETE ON ideas
+            BEGIN
+                DELETE FROM idea_terms WHERE id = OLD.id;
+            END"""
+        )
+        rows = c.execute("SELECT id, name, content FROM ideas WHERE id > 0").fetchall()
+        # the trigrams of these terms are added by create_trigrams
+        c.executemany(
+            store.insert_term_sql,
+            [
+                (term, id, n)
+                for id, name, content in rows
+                for term, n in tfidf.term_counts(name, content).items()
+            ],
+        )
 
-    # Drop the view if it already exists
-    c.execute("DROP VIEW IF EXISTS idea_positions")
 
-    # Base SQL query
-    query = """\
-CREATE VIEW idea_positions AS
-SELECT 
-    name,
-    content,
-    state,
-    status,
-    added,
-    probed,
-    id,
-    ROW_NUMBER() OVER (ORDER BY state, name, status, id) AS position
-FROM ideas
-"""
+def create_trigrams():
+    """
+    Create the trigram index of the words in idea_terms for find --fuzzy. It
+    holds each distinct word once, however many ideas use it, so it stays
+    small as ideas are added. Words are added along with their first idea and
+    removed by a trigger when their last idea no longer uses them.
+    """
+    c.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'term_trigrams'"
+    )
+    if c.fetchone()[0]:
+        return
+    with write_transaction():
+        c.execute(
+            """\
+            CREATE TABLE term_trigrams (
+                trigram TEXT,
+                term TEXT,
+                PRIMARY KEY (trigram, term)
+            ) WITHOUT ROWID"""
+        )
+        c.execute("CREATE INDEX term_trigrams_term ON term_trigrams (term)")
+        c.execute(
+            """\
+            CREATE TRIGGER term_trigrams_delete AFTER DELETE ON idea_term_df
+            BEGIN
+                DELETE FROM term_trigrams WHERE term = OLD.term;
+            END"""
+        )
+        store.index_trigrams(
+            [row[0] for row in c.execute("SELECT term FROM idea_term_df").fetchall()]
+        )
 
-    # Append the WHERE clause if a filter condition is provided
-    if filter_condition:
-        query += f"WHERE {filter_condition} "
 
-    c.execute(query)
-    conn.commit()
+def reindex_terms():
+    """
+    Index again the terms of the ideas with characters outside ASCII, which
+    term_counts split words at before schema_version 4 matched letters and
+    digits in any script.
+    """
+    if store.user_version() >= 4:
+        return
+    rows = c.execute(
+        """\
+        SELECT id, name, content FROM ideas
+        WHERE id > 0 AND name || COALESCE(content, '') GLOB '*[^ -~]*'"""
+    ).fetchall()
+    with write_transaction():
+        for id, name, content in rows:
+            store.index_terms(id, tfidf.term_counts(name, content))
 
 
-create_view()
+def create_events():
+    """
+    Create the append-only history of what happened to each idea, one row of
+    small integers per event, with indexes for the events of an idea and for
+    those in a time range, and the monthly counts that older events are rolled
+    up into. Events go when their idea is deleted. Existing ideas start with
+    the times they were added and last probed.
+    """
+    c.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'idea_events'"
+    )
+    if c.fetchone()[0]:
+        return
+    with write_transaction():
+        c.execute(
+            """\
+            CREATE TABLE idea_events (
+                idea_id INTEGER NOT NULL,
+                ts INTEGER NOT NULL,
+                kind INTEGER NOT NULL
+            )"""
+        )
+        c.execute("CREATE INDEX idea_events_idea ON idea_events (idea_id, ts)")
+        c.execute("CREATE INDEX idea_events_ts ON idea_events (ts)")
+        c.execute(
+            """\
+            CREATE TABLE idea_event_months (
+                idea_id INTEGER,
+                month INTEGER,
+                kind INTEGER,
+                n INTEGER NOT NULL,
+                PRIMARY KEY (idea_id, month, kind)
+            ) WITHOUT ROWID"""
+        )
+        c.execute(
+            """\
+            CREATE TRIGGER idea_events_idea_delete AFTER DELETE ON ideas
+            BEGIN
+                DELETE FROM idea_events WHERE idea_id = OLD.id;
+                DELETE FROM idea_event_months WHERE idea_id = OLD.id;
+            END"""
+        )
+        # paused ideas hold elapsed times rather than timestamps
+        c.execute(
+            """\
+            INSERT INTO idea_events (idea_id, ts, kind)
+            SELECT id, added, ? FROM ideas WHERE id > 0 AND state = 1
+            UNION ALL
+            SELECT id, probed, ? FROM ideas WHERE id > 0 AND state = 1 AND probed > added
+            ORDER BY 2""",
+            (event_kinds.index("added"), event_kinds.index("reviewed")),
+        )
 
 
-def set_find(pattern: str):
-    """Store pattern in content for id=0"""
-    with conn:
+def create_tags():
+    """
+    Create the tags and the ideas that have each, keyed by tag so that the ideas
+    with a tag are a range scan when the tag bitmaps are built, and indexed by
+    idea for the tags of an idea. An idea's tags go when it is deleted.
+    """
+    c.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'tags'"
+    )
+    if c.fetchone()[0]:
+        return
+    with write_transaction():
         c.execute(
-            "UPDATE ideas SET content = :content WHERE id = 0",
-            {"content": pattern},
+            """\
+            CREATE TABLE tags (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            )"""
+        )
+        c.execute(
+            """\
+            CREATE TABLE idea_tags (
+                tag_id INTEGER NOT NULL,
+                idea_id INTEGER NOT NULL,
+                PRIMARY KEY (tag_id, idea_id)
+            ) WITHOUT ROWID"""
+        )
+        c.execute("CREATE INDEX idea_tags_idea ON idea_tags (idea_id)")
+        c.execute(
+            """\
+            CREATE TRIGGER idea_tags_idea_delete AFTER DELETE ON ideas
+            BEGIN
+                DELETE FROM idea_tags WHERE idea_id = OLD.id;
+            END"""
         )
 
 
+def initialize_settings():
+    """Ensure row 0 exists for storing view settings."""
+    c.execute("SELECT COUNT(*) FROM ideas WHERE id = 0")
+    if c.fetchone()[0] == 0:
+        with write_transaction():
+            c.execute(
+                """INSERT INTO ideas (name, content, state, status, added, probed, id)
+                   VALUES ('settings', '', ?, ?, 0, 0, 0)""",
+                (default_state_setting, default_status_setting),
+            )
+
+
+def set_find(pattern: Optional[str]):
+    """Store pattern in content for id=0 and rebuild the positions for it."""
+    store.set_find(pattern)
+
+
 def get_find():
     """
     Fetch the current find pattern from content in idea id 0.
     """
-    c.execute("SELECT content FROM ideas WHERE id = 0")
-    result = c.fetchone()[0]
-    # click_log(f"{result = }")
-    if result:
-        return result
-    else:
-        return None
+    return store.settings()[0]
 
 
 def set_hide_encoded(lst: List[int]):
@@ -144,12 +1622,7 @@ def set_hide_encoded(lst: List[int]):
             ret.append(1)
         else:
             ret.append(0)
-    encoded = encode_binary_list(ret)
-    with conn:
-        c.execute(
-            "UPDATE ideas SET status = :status WHERE id = 0",
-            {"status": encoded},
-        )
+    store.set_show(encode_binary_list(ret))
 
 
 def set_show_encoded(lst: List[int]):
@@ -164,25 +1637,29 @@ def set_show_encoded(lst: List[int]):
             ret.append(0)
         else:
             ret.append(1)
-    encoded = encode_binary_list(ret)
-    with conn:
-        c.execute(
-            "UPDATE ideas SET status = :status WHERE id = 0",
-            {"status": encoded},
-        )
+    store.set_show(encode_binary_list(ret))
+
+
+def set_sort(sort: str):
+    """Store the sort mode, one of sort_modes, and rebuild the positions for it."""
+    store.set_sort(sort)
+
+
+def get_sort() -> str:
+    """Fetch the current sort mode from state in idea id 0."""
+    return store.settings()[2]
 
 
 def get_view_settings() -> List[int]:
     """
     Fetch the current view settings as an encoded integer from status in idea id 0 and return the decoded list of binaries.
     """
-    c.execute("SELECT status FROM ideas WHERE id = 0")
-    result = c.fetchone()[0]
-    # click_log(f"{result = }")
+    return decode_view_settings(store.settings()[1])
+
+
+def decode_view_settings(result: Optional[int]) -> List[int]:
     if result:
-        ret = decode_to_binary_list(result)
-        # click_log(f"{ret = }")
-        return ret
+        return decode_to_binary_list(result)
     else:
         # return [0, 0, 0, 0]
         return [1, 1, 1]
@@ -213,79 +1690,197 @@ def pos_from_show_binaries(lst_of_binaries: list[int]) -> list[int]:
     return res
 
 
-def get_ideas_from_view() -> List[Tuple]:
+def get_ideas_from_view(
+    tags: List[str] = (), exclude: List[str] = ()
+) -> Tuple[Iterator[IdeaRow], List[int]]:
     """
-    Fetch filtered ideas based on the current view settings.
+    Fetch filtered ideas based on the current view settings, keeping only those
+    with every one of tags and none of exclude if any are given. These keep the
+    positions they have in the view.
 
     Returns:
-        List[Tuple]: Filtered list of ideas.
+        Tuple[Iterator[IdeaRow], List[int]]: A generator of the filtered ideas,
+        fetched fetch_size rows at a time, and the list of shown statuses.
+        pos_to_id is rebuilt as the generator is consumed.
     """
-    global pos_to_id
-    # Get current view settings
-    show_binaries = get_view_settings()
-    # click_log(f"{show_binaries = }")
-    show_list = pos_from_show_binaries(show_binaries)
-    # click_log(f"{show_list = }")
+    show_list = pos_from_show_binaries(get_view_settings())
+    return _stream_ideas(tags, exclude), show_list
 
-    # status_list = [1, 3]  # List of integers for filtering
-    where_clauses = ["id > 0"]  # Always skip row 0
 
-    # Add the status condition
-    if show_list:  # Ensure the list is not empty
-        placeholders = ", ".join(["?"] * len(show_list))
-        where_clauses.append(f"status IN ({placeholders})")
+def _stream_ideas(tags: List[str], exclude: List[str]) -> Iterator[IdeaRow]:
+    pos_to_id.clear()
+    rows = (
+        store.rows_in_view([*bitmap.to_ids(store.tagged(tags, exclude))])
+        if tags or exclude
+        else store.list_rows()
+    )
+    for row in rows:
+        pos_to_id[row.position] = row.id
+        yield row
 
-    # Combine all conditions into a single WHERE clause
-    where_clause = " AND ".join(where_clauses)
 
-    # Construct the full query
-    query = f"""\
-SELECT id, name, status, state, added, probed, position
-FROM idea_positions
-WHERE {where_clause}\
+def create_positions():
+    """
+    Create the idea_positions table that materializes the list: position n holds
+    the id of the n-th idea that satisfies the current find and show settings in
+    list order. It is rebuilt when those settings change and otherwise kept
+    current by reposition as ideas are written, so that reading the list or the
+    id at a position are indexed reads.
     """
+    c.execute("SELECT type FROM sqlite_master WHERE name = 'idea_positions'")
+    row = c.fetchone()
+    if row and row[0] == "table":
+        return
+    with write_transaction():
+        # earlier versions used a ROW_NUMBER view
+        c.execute("DROP VIEW IF EXISTS idea_positions")
+        c.execute(
+            """\
+            CREATE TABLE idea_positions (
+                position INTEGER PRIMARY KEY,
+                id INTEGER NOT NULL UNIQUE
+            )"""
+        )
+        rebuild_positions()
 
-    # Execute the query with the parameters for the placeholders
-    # click_log(f"{query = }; {show_list}")
-    c.execute(query, show_list)  # Fetch ideas based on filters
-    ideas = c.fetchall()
-    # click_log(f"{ideas = }")
-    pos = 0
-    for idea in ideas:
-        pos += 1
-        id = idea[0]
-        pos_to_id[pos] = id
 
-    # click_log(f"{pos_to_id = }")
-    return ideas, show_list
+def rebuild_positions():
+    """Renumber idea_positions from scratch. Call within write_transaction."""
+    store.rebuild_positions()
 
 
-def get_id_from_position(position: int) -> int:
-    """Get the ID of the idea at the specified position in the current view."""
-    # click_log(f"{pos_to_id = }")
-    id = pos_to_id.get(position)
-    # click_log(f"{position = } -> {id = }")
-    if id:
-        return id
-    # raise ValueError(f"No id corresponding to position {position}")
+def reposition(idea_ids: List[int]):
+    """Bring idea_positions up to date for idea_ids. Call within write_transaction."""
+    store.reposition(idea_ids)
 
-    c.execute(
-        "SELECT position, id FROM idea_positions WHERE position = :position",
-        {"position": position},
-    )
-    result = c.fetchone()
 
-    # Log the mapping for debugging
-    with open("debug.log", "a") as debug_file:
-        click.echo(f"Looking up position: {position}", file=debug_file)
-        c.execute("SELECT position, id FROM idea_positions")
-        rows = c.fetchall()
-        for row in rows:
-            click.echo(f"View Row - Position: {row[0]}, ID: {row[1]}", file=debug_file)
+def migrate():
+    """
+    Bring the schema up to date if user_version says that it is older than
+    schema_version. Each step checks what is already there, so databases
+    created by versions before user_version was kept are migrated as well.
+    """
+    if store.user_version() >= schema_version:
+        return
+    create_table()
+    create_indexes()
+    create_summary()
+    create_minhash()
+    create_terms()
+    create_trigrams()
+    reindex_terms()
+    create_events()
+    create_tags()
+    initialize_settings()
+    create_positions()
+    with write_transaction():
+        c.execute(f"PRAGMA user_version = {schema_version}")
+
+
+migrate()
+
+
+def start_working_set():
+    """
+    In memory mode start logging and flushing the working set and otherwise
+    apply any transactions left in the redo log by a session in memory mode
+    that ended without flushing them.
+    """
+    if working is not None:
+        working.start()
+        atexit.register(working.close)
+    else:
+        working_set.recover(store, working_set.redo_path(db_path))
 
-    if result:
-        return result[1]  # Return the ID
-    raise ValueError(f"No idea found at position {position}.")
+
+start_working_set()
+
+
+def flush_working_set() -> Optional[bool]:
+    """
+    Write the working set to disk now. Returns None when not in memory mode and
+    otherwise whether there was anything to write.
+    """
+    if working is None:
+        return None
+    return working.flush()
+
+
+def defer_positions():
+    """
+    Within write_transaction, reposition the ideas written in the enclosed block
+    together, as late as possible, rather than one write at a time.
+    """
+    return store.defer_positions()
+
+
+def run_maintenance(full: bool = False, idle: bool = False) -> maintenance.Report:
+    """
+    Analyze and vacuum the database as needed, see maintenance.run. In memory
+    mode this works on the working set, which the next flush writes to disk.
+    """
+    with store.lock:
+        report = maintenance.run(conn, full=full, idle=idle)
+        # statistics and vacuums are not counted by total_changes or logged
+        if working is not None and report.actions != ["optimize"]:
+            working.dirty = True
+    return report
+
+
+def get_view_count() -> int:
+    """The number of ideas in the current view."""
+    return store.view_count()
+
+
+def get_change_token() -> Tuple:
+    """
+    A value that changes when the ideas may have changed, got without reading
+    them: data_version for commits by other connections, here or in other
+    processes, and the modification times of the database and its write-ahead
+    log for the file being replaced or changed by other means.
+    """
+    token = [store.data_version()]
+    for path in (db_path, f"{db_path}-wal"):
+        try:
+            stat = os.stat(path)
+            token.extend([stat.st_ino, stat.st_mtime_ns, stat.st_size])
+        except FileNotFoundError:
+            token.extend([None, None, None])
+    return tuple(token)
+
+
+def get_due_ideas(added_cutoffs: List[int], probed_cutoff: int) -> List[DueIdea]:
+    """
+    Fetch the active ideas that are overdue, i.e., added no later than the
+    cutoff for their status, or idle, i.e., probed no later than probed_cutoff.
+    Each cutoff is a range on ideas_state_status_added or ideas_state_probed so
+    only the due rows are read.
+
+    Returns:
+        List[DueIdea]: with late the seconds past the larger of the two cutoffs,
+        most late first.
+    """
+    return store.due_ideas(added_cutoffs, probed_cutoff)
+
+
+def get_counts() -> List[Tuple]:
+    """Fetch (status, state, count) from the summary table."""
+    return store.counts()
+
+
+def get_total() -> int:
+    """The number of ideas from the summary table."""
+    return store.total()
+
+
+def get_added_days() -> List[Tuple]:
+    """Fetch (status, day, count) for active ideas from the summary table."""
+    return store.added_days()
+
+
+def get_id_from_position(position: int) -> int:
+    """Get the ID of the idea at the specified position in the current view."""
+    return get_ids_from_positions([position])[0]
 
 
 def insert_idea(
@@ -296,63 +1891,292 @@ def insert_idea(
     added: int = timestamp(),
     probed: int = timestamp(),
 ):
-    """Insert a new idea into the database."""
+    """Insert a new idea into the database and return its id."""
     probed = probed if probed is not None else added
-
-    # Determine the next position
-    # c.execute("SELECT MAX(position) FROM ideas")
-    # max_position = c.fetchone()[0]
-    # position = (max_position + 1) if max_position is not None else 1
-
-    with conn:
-        c.execute(
-            """INSERT INTO ideas (name, content, status, state, added, probed)
-               VALUES (:name, :content, :status, :state, :added, :probed)""",
-            {
-                # "position": position,
-                "name": name,
-                "content": content,
-                "status": status,
-                "state": state,
-                "added": added,
-                "probed": probed,
-            },
-        )
-        sqlite3.register_adapter
+    return store.insert(
+        {
+            "name": name,
+            "content": content,
+            "status": status,
+            "state": state,
+            "added": added,
+            "probed": probed,
+            "hash": content_hash(name, content),
+        },
+        text_index(name, content),
+        timestamp(),
+    )
 
 
-def get_idea_by_position(position: int):
+def get_idea_by_position(position: int) -> Optional[Idea]:
     try:
         # Get the ID from the position
-        # click_log(f"calling get_id_from_position with {position = }")
         idea_id = get_id_from_position(position)
-        if not idea_id:
-            return None
-        # click_log(f"{position = }; {idea_id = }")
     except ValueError as e:
         click.echo(str(e))
         return
 
-    c.execute(
-        f"""SELECT id, name, status, state, added, probed, content 
-        FROM ideas 
-        WHERE id={idea_id}"""
+    row = store.read(idea_id)
+    if row is None:
+        return None
+    # remember what was read so that update_idea can detect changes made since
+    snapshots[idea_id] = dict(zip(snapshot_columns, row))
+    return Idea(*row[:-2])
+
+
+snapshot_columns = [
+    "id",
+    "name",
+    "status",
+    "state",
+    "added",
+    "probed",
+    "content",
+    "hash",
+    "version",
+]
+
+
+def is_unchanged(idea_id: int, name: str, content: str) -> bool:
+    """
+    True if name and content hash the same as the idea did when last read by
+    get_idea_by_position, e.g., when an edit was quit without changes.
+    """
+    snapshot = snapshots.get(idea_id)
+    return snapshot is not None and snapshot["hash"] == content_hash(name, content)
+
+
+def get_content_hashes() -> Dict[int, bytes]:
+    """
+    Map the id of each idea to the hash of its name and content so that export,
+    sync and backup tools can tell which ideas changed without reading them.
+    """
+    return store.hashes()
+
+
+def get_likely_duplicates(
+    idea_id: int, threshold: float = minhash.default_threshold
+) -> List[Tuple[int, str, float]]:
+    """
+    (id, name, similarity) of the ideas whose estimated similarity to idea_id is
+    at least threshold, most similar first. Only ideas sharing an LSH bucket
+    with idea_id are compared so this takes a handful of indexed reads.
+    """
+    sig = store.signatures([idea_id]).get(idea_id)
+    if sig is None:
+        return []
+    scored = [
+        (id, minhash.similarity(sig, other))
+        for id, other in store.bucket_mates(idea_id, sig)
+    ]
+    scored = [(id, score) for id, score in scored if score >= threshold]
+    rows = store.rows([id for id, _ in scored])
+    return sorted(
+        ((id, rows[id][1], score) for id, score in scored if id in rows),
+        key=lambda x: -x[2],
     )
-    return c.fetchone()
 
 
-def delete_idea(position: int):
-    """Delete an idea by its position in the current view."""
+def get_related_ideas(idea_id: int, limit: int = 10) -> List[Tuple]:
+    """
+    (id, name, status, state, added, probed, similarity) of the limit ideas
+    most similar to idea_id by the cosine of their TF-IDF vectors, most similar
+    first. Only ideas sharing a selective term with idea_id are scored.
+    """
+    scored = store.related(idea_id, limit)
+    rows = store.rows([id for id, _ in scored])
+    return [rows[id] + (score,) for id, score in scored if id in rows]
+
+
+def get_fuzzy_matches(
+    pattern: str,
+    limit: int = trigram.default_limit,
+    threshold: float = trigram.default_threshold,
+) -> List[Tuple]:
+    """
+    Rank ideas by how well their words match those of pattern, allowing for
+    typos. Each word of pattern is matched with the words of the vocabulary
+    whose trigrams overlap its own with a similarity of at least threshold, and
+    an idea scores the mean over the words of pattern of its best match.
+
+    Returns:
+        List[Tuple]: (id, name, status, state, added, probed, score) of the
+        limit best matches, best first.
+    """
+    words = [*tfidf.term_counts(pattern, "")]
+    if not words:
+        return []
+    scores = {}
+    for word in words:
+        similar = store.similar_terms(word, threshold)
+        best = {}
+        for id, term in store.ideas_with_terms([*similar]):
+            best[id] = max(best.get(id, 0), similar[term])
+        for id, score in best.items():
+            scores[id] = scores.get(id, 0) + score / len(words)
+    top = heapq.nlargest(limit, scores.items(), key=lambda x: x[1])
+    rows = store.rows([id for id, _ in top])
+    return [rows[id] + (score,) for id, score in top if id in rows]
+
+
+def get_duplicate_groups(
+    threshold: float = minhash.default_threshold,
+) -> List[List[Tuple]]:
+    """
+    Group the ideas that are likely near duplicates of one another. Pairs that
+    share an LSH bucket and whose estimated similarity is at least threshold
+    are joined into groups, largest first.
+
+    Returns:
+        List[List[Tuple]]: for each group, (id, name, status, state, added,
+        probed, similarity) of its ideas ordered by name, with similarity the
+        highest estimate between the idea and another in the group.
+    """
+    pairs = store.candidate_pairs()
+    sigs = store.signatures([*{id for pair in pairs for id in pair}])
+    parent = {}
+    best = {}
+
+    def find(id):
+        while parent.setdefault(id, id) != id:
+            parent[id] = parent[parent[id]]
+            id = parent[id]
+        return id
+
+    for a, b in pairs:
+        score = minhash.similarity(sigs[a], sigs[b])
+        if score < threshold:
+            continue
+        parent[find(a)] = find(b)
+        best[a] = max(best.get(a, 0), score)
+        best[b] = max(best.get(b, 0), score)
+    groups = {}
+    for id in best:
+        groups.setdefault(find(id), []).append(id)
+    rows = store.rows([*best])
+    return sorted(
+        (
+            sorted((rows[id] + (best[id],) for id in group), key=lambda r: r[1])
+            for group in groups.values()
+        ),
+        key=lambda group: (-len(group), group[0][1]),
+    )
+
+
+def read_snapshot(idea_id: int) -> Optional[dict]:
+    """Return the current values of idea_id as a dict or None if it no longer exists."""
+    row = store.read(idea_id)
+    return dict(zip(snapshot_columns, row)) if row else None
+
+
+def get_idea_history(idea_id: int, days: int) -> Tuple[List[Tuple], List[Tuple]]:
+    """
+    The (ts, kind) events of idea_id in the last days days, newest first, and
+    the (month, kind, count) totals of its events that have been rolled up.
+    """
+    since = timestamp() - days * 86400
+    return store.events(idea_id, since), store.event_months(idea_id)
+
+
+def get_activity(days: int) -> List[Tuple]:
+    """
+    ("YYYY-MM-DD", kind, count) for the events of all ideas on the last days
+    local dates, today included.
+    """
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return store.activity(int((today - timedelta(days=days - 1)).timestamp()))
+
+
+def get_ids_from_positions(positions: List[int]) -> List[int]:
+    """
+    Get the IDs of the ideas at the specified positions in the current view,
+    looked up together in idea_positions. A position that the last list showed
+    with another idea, as when another process has changed the ideas since, is
+    an error rather than a quiet change of target.
+    """
+    found = store.ids_at(positions)
+    stale = [
+        pos for pos in positions if pos_to_id.get(pos, found.get(pos)) != found.get(pos)
+    ]
+    if stale:
+        raise ValueError(
+            f"The list has changed at position{'s' if len(stale) > 1 else ''} {', '.join(map(str, stale))} since it was shown: list the ideas again."
+        )
+    missing = [pos for pos in positions if pos not in found]
+    if missing:
+        raise ValueError(
+            f"No idea found at position{'s' if len(missing) > 1 else ''} {', '.join(map(str, missing))}."
+        )
+    return [found[pos] for pos in positions]
+
+
+def get_view_positions(idea_ids: List[int]) -> Dict[int, int]:
+    """
+    Map those of idea_ids that are in the current view to their positions,
+    which, unlike an index into a ranked list, any later command or process
+    takes to mean the same idea until the view changes.
+    """
+    return store.positions_of(idea_ids) if idea_ids else {}
+
+
+def resolve_positions(positions: List[int]) -> List[int]:
+    """
+    get_ids_from_positions for the commands that change ideas: a position with
+    no idea raises a ClickException, which fails the command so that, e.g.,
+    batch counts the line as an error.
+    """
     try:
-        # Get the ID from the position
-        idea_id = get_id_from_position(position)
+        return get_ids_from_positions(positions)
     except ValueError as e:
-        click.echo(str(e))
-        return
+        raise click.ClickException(str(e)) from None
+
+
+def delete_ideas(positions: List[int]) -> int:
+    """Delete the ideas at positions in the current view in one transaction."""
+    idea_ids = resolve_positions(positions)
+    store.delete(idea_ids)
+    return len(idea_ids)
+
+
+def set_status(positions: List[int], status: int) -> int:
+    """
+    Set status and probed for the ideas at positions in one transaction, skipping
+    those whose status is already status. Returns the number of ideas changed.
+    """
+    idea_ids = resolve_positions(positions)
+    return len(store.set_status(idea_ids, status, timestamp()))
+
 
-    # Delete the idea by ID
-    with conn:
-        c.execute("DELETE FROM ideas WHERE id = :id", {"id": idea_id})
+def toggle_pause(positions: List[int]) -> int:
+    """
+    Toggle state between active and paused for the ideas at positions in one transaction.
+    Pausing replaces added and probed with the times elapsed since then and
+    activating restores them, so both conversions are now - value.
+    """
+    idea_ids = resolve_positions(positions)
+    return store.toggle_pause(idea_ids, timestamp())
+
+
+def update_kinds(values: Dict, before: Dict) -> List[int]:
+    """
+    The kinds of the events of an update writing values, as for update_idea,
+    over an idea with the columns before: edited for a change of name, content
+    or added, status for one of status and paused or activated for one of
+    state. Columns written with the values they had make no event.
+    """
+    changed = {
+        col
+        for col in ("name", "content", "added", "status", "state")
+        if values[col] is not None and values[col] != before[col]
+    }
+    kinds = []
+    if changed & {"name", "content", "added"}:
+        kinds.append("edited")
+    if "status" in changed:
+        kinds.append("status")
+    if "state" in changed:
+        kinds.append("activated" if values["state"] == 1 else "paused")
+    return [event_kinds.index(kind) for kind in kinds]
 
 
 def update_idea(
@@ -363,61 +2187,111 @@ def update_idea(
     state: Optional[int] = None,
     added: Optional[int] = None,
     probed: Optional[int] = None,
-):
+) -> bool:
+    """
+    Update the idea at position with compare-and-swap on its version. The update
+    applies only if the idea is unchanged since it was last read by
+    get_idea_by_position, or now if it has not been read. If another session has
+    changed it in the meantime, the update is retried against the new version as
+    long as the other session left the columns being written alone. Otherwise
+    the conflict is reported and nothing is written. Returns True if written.
+    """
     try:
         # Get the ID from the position
         idea_id = get_id_from_position(position)
     except ValueError as e:
         click.echo(str(e))
-        return
-    # Build the base query and parameters
-    base_query = "UPDATE ideas SET "
-    updates = ["probed = :probed"]
-    params = {"id": idea_id, "probed": probed if not None else timestamp()}
-
-    # Append non-None fields to the updates list and params dict
-    if name is not None:
-        updates.append("name = :name")
-        params["name"] = name
-    if content is not None:
-        updates.append("content = :content")
-        params["content"] = content
-    if status is not None:
-        updates.append("status = :status")
-        params["status"] = status
-    if state is not None:
-        updates.append("state = :state")
-        params["state"] = state
-    if added is not None:
-        updates.append("added = :added")
-        params["added"] = added
-    # if probed is not None:
-    #     updates.append("probed = :probed")
-    #     params["probed"] = probed
-
-    # Join updates to form the full query and add the WHERE clause
-    query = f"{base_query} {', '.join(updates)} WHERE id = :id"
-
-    # Execute the query with the parameters
-    # click_log(f"{query =}; {params = }")
-    with conn:
-        c.execute(query, params)
-
-
-def review_idea(position: int):
+        return False
+    values = {
+        "id": idea_id,
+        "name": name,
+        "content": content,
+        "status": status,
+        "state": state,
+        "added": added,
+        "probed": probed if probed is not None else timestamp(),
+        "hash": None,
+    }
+    # probed is a last-writer-wins timestamp and does not count as a conflict
+    written = [
+        col
+        for col, value in values.items()
+        if value is not None and col not in ("id", "probed")
+    ]
+
+    expected = snapshots.get(idea_id) or read_snapshot(idea_id)
     try:
-        # Get the ID from the position
-        idea_id = get_id_from_position(position)
-        # click_log(f"{position = } -> {idea_id = }")
-    except ValueError as e:
+        for _ in range(conflict_retries):
+            if expected is None:
+                raise ConflictError(
+                    f"Idea at position {position} was deleted by another session."
+                )
+            text = None
+            if name is not None or content is not None:
+                new_name = name if name is not None else expected["name"]
+                new_content = content if content is not None else expected["content"]
+                values["hash"] = content_hash(new_name, new_content)
+                text = text_index(new_name, new_content)
+            if store.update(
+                {**values, "version": expected["version"]},
+                text,
+                update_kinds(values, expected),
+            ):
+                snapshots.pop(idea_id, None)
+                return True
+            current = read_snapshot(idea_id)
+            changed = [
+                col
+                for col in written
+                if current is not None and current[col] != expected[col]
+            ]
+            if changed:
+                raise ConflictError(
+                    f"'{expected['name']}' was changed by another session ({', '.join(changed)}). "
+                    "List the ideas again and repeat the change."
+                )
+            expected = current
+        raise ConflictError(
+            f"'{expected['name']}' keeps being changed by another session. Try again later."
+        )
+    except ConflictError as e:
+        snapshots.pop(idea_id, None)
         click.echo(str(e))
-        return
+        return False
 
-    with conn:
-        c.execute(
-            "UPDATE ideas SET probed = :probed WHERE id = :id",
-            {"id": idea_id, "probed": timestamp()},
-        )
+
+def tag_ideas(positions: List[int], names: List[str]) -> int:
+    """
+    Tag the ideas at positions with names in one transaction. Returns the number
+    of tags added.
+    """
+    idea_ids = resolve_positions(positions)
+    return store.tag(idea_ids, names)
+
+
+def untag_ideas(positions: List[int], names: List[str]) -> int:
+    """
+    Remove names from the ideas at positions in one transaction. Returns the
+    number of tags removed.
+    """
+    idea_ids = resolve_positions(positions)
+    return store.untag(idea_ids, names)
+
+
+def get_idea_tags(idea_id: int) -> List[str]:
+    return store.idea_tags(idea_id)
+
+
+def get_tag_counts() -> List[Tuple[str, int]]:
+    """(name, ideas) for each tag in use in name order."""
+    return store.tag_counts()
+
+
+def review_ideas(positions: List[int]) -> int:
+    """Set probed to now for the ideas at positions in one transaction."""
+    idea_ids = resolve_positions(positions)
+    store.review(idea_ids, timestamp())
+    return len(idea_ids)
 
 
 def backup_with_retention(source_db: str, backup_dir: str, retention: int = 7):
@@ -0,0 +1,81 @@
+import heapq
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from . import idea_home
+
+# ordering used by the idea_positions view with home added to break ties across homes
+order_by = "state, name, status, home, id"
+
+
+def _sort_key(row: Tuple):
+    home, id, name, status, state, added, probed = row
+    return (state, name, status, home, id)
+
+
+def federated_homes(homes: List[str]) -> List[str]:
+    """
+    Return the idea homes to search: the current home, the given homes and those
+    listed in the IDEAHOMES environment variable, separated like PATH, without
+    duplicates or homes that have no ideas.db.
+    """
+    envhomes = [h for h in os.environ.get("IDEAHOMES", "").split(os.pathsep) if h]
+    res = []
+    for home in [idea_home, *homes, *envhomes]:
+        home = os.path.abspath(os.path.expanduser(home))
+        if home not in res and os.path.exists(os.path.join(home, "ideas.db")):
+            res.append(home)
+    return res
+
+
+def _query_batch(labelled_homes: List[Tuple[str, str]], pattern: Optional[str]):
+    """
+    ATTACH the ideas.db of each home read-only to a fresh connection and fetch
+    the matching ideas from all of them with a single UNION ALL query.
+    """
+    conn = sqlite3.connect(":memory:", uri=True)
+    try:
+        selects = []
+        params = []
+        for i, (label, home) in enumerate(labelled_homes):
+            uri = f"file:{os.path.join(home, 'ideas.db')}?mode=ro"
+            conn.execute(f"ATTACH DATABASE ? AS h{i}", (uri,))
+            select = f"""\
+SELECT ? AS home, id, name, status, state, added, probed
+FROM h{i}.ideas
+WHERE id > 0"""
+            params.append(label)
+            if pattern:
+                select += " AND (name LIKE ? OR content LIKE ?)"
+                params.extend([f"%{pattern}%", f"%{pattern}%"])
+            selects.append(select)
+        query = "\nUNION ALL\n".join(selects) + f"\nORDER BY {order_by}"
+        return conn.execute(query, params).fetchall()
+    finally:
+        conn.close()
+
+
+def federated_ideas(homes: List[str], pattern: Optional[str] = None) -> List[Tuple]:
+    """
+    Fetch the ideas from all homes, optionally those whose name or content is
+    LIKE pattern, as (home, id, name, status, state, added, probed) rows merged
+    in list order. Homes are attached in batches no larger than sqlite's limit
+    on attached databases and the batches are queried in parallel.
+    """
+    labels = [os.path.basename(os.path.normpath(home)) for home in homes]
+    if len(set(labels)) < len(labels):
+        labels = homes
+    labelled = list(zip(labels, homes))
+    probe = sqlite3.connect(":memory:")
+    max_attached = probe.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+    probe.close()
+    batches = [
+        labelled[i : i + max_attached] for i in range(0, len(labelled), max_attached)
+    ]
+    if len(batches) == 1:
+        return _query_batch(batches[0], pattern)
+    with ThreadPoolExecutor(max_workers=min(len(batches), 8)) as executor:
+        results = list(executor.map(lambda b: _query_batch(b, pattern), batches))
+    return list(heapq.merge(*results, key=_sort_key))
@@ -1,58 +1,101 @@
 #! /usr/bin/env python3
+import bisect
+import functools
+import itertools
 import json
 import logging
 import os
+import re
+import select
 import shlex
 import sqlite3
 import sys
+import threading
+import time
+from contextlib import redirect_stdout
 from pathlib import Path
-from typing import List, Optional, Required, Tuple
+from typing import Iterator, List, Optional, Required, Tuple
 
 import click
-from click.testing import CliRunner
 from click_shell import shell
 
 # from prompt_toolkit.styles.named_colors import NAMED_COLORS
 from rich import box, print
-from rich.console import Console
+from rich.cells import set_cell_size
+from rich.console import Console, Group
+from rich.live import Live
 from rich.logging import RichHandler
 from rich.markdown import Markdown
 from rich.panel import Panel
+from rich.progress import (
+    BarColumn,
+    Progress,
+    SpinnerColumn,
+    TextColumn,
+    TimeElapsedColumn,
+    TimeRemainingColumn,
+)
 from rich.table import Table
+from rich.text import Text
 
 from modules.database import (
-    create_view,
-    delete_idea,
+    delete_ideas,
+    flush_working_set,
+    get_added_days,
+    get_change_token,
+    get_counts,
+    get_due_ideas,
+    get_duplicate_groups,
+    get_activity,
     get_find,
+    get_fuzzy_matches,
+    get_id_from_position,
     get_idea_by_position,
+    get_idea_history,
+    get_idea_tags,
     get_ideas_from_view,
+    get_sort,
+    get_tag_counts,
+    get_likely_duplicates,
+    get_related_ideas,
+    get_total,
+    get_view_count,
+    get_view_positions,
     get_view_settings,
     insert_idea,
-    review_idea,
+    is_unchanged,
+    review_ideas,
+    run_maintenance,
     set_find,
     set_hide_encoded,
     set_show_encoded,
+    set_sort,
+    set_status,
+    tag_ideas,
+    toggle_pause,
+    untag_ideas,
     update_idea,
 )
 from modules.model import (
-    click_log,
+    due_cutoffs,
     edit_content_with_nvim,
     format_age_color,
     format_datetime,
     format_idle_color,
     format_timedelta,
+    get_age_color,
+    get_idle_color,
     is_valid_path,
     timestamp,
 )
 from modules.model import type_colors as status_colors
 
-from . import CONFIG_FILE, backup_dir, db_path, idea_home, log_dir, markdown_dir
+from . import database, minhash
+from .working_set import DiskChangedError
+from .database import event_kinds, sort_modes
+from . import CONFIG_FILE, idea_home
 from .__version__ import version
 
-click_log(
-    f"{idea_home = }; {backup_dir = }; {log_dir =}, {markdown_dir}, {db_path = }; {version = }"
-)
-
 status_names = ["inkling", "notion", "idea"]
 status_pos_to_str = {pos: value for pos, value in enumerate(status_names)}
 status_str_to_pos = {value: pos for pos, value in enumerate(status_names)}
@@ -87,6 +130,73 @@ notice_color = "#ffa500"
 
 console = Console()
 
+# Set by the async shell when a newer command arrives so that a render still in
+# progress in the worker thread is abandoned instead of finishing.
+render_cancel = threading.Event()
+
+
+class RenderCancelled(Exception):
+    """Raised by _list_all when render_cancel is set."""
+
+
+class PositionsType(click.ParamType):
+    """
+    Positions given as a comma separated list of positions and ranges,
+    e.g., "3", "1,5,9", "3-40" or "2-7,9".
+    """
+
+    name = "positions"
+
+    def convert(self, value, param, ctx):
+        if not isinstance(value, str):
+            # already converted, e.g., when forwarded from an alias
+            return value
+        positions = []
+        try:
+            for part in str(value).split(","):
+                part = part.strip()
+                if not part:
+                    continue
+                if "-" in part:
+                    start, end = (int(x) for x in part.split("-", 1))
+                    if start > end:
+                        start, end = end, start
+                    listed = get_view_count()
+                    if end - start >= listed:
+                        self.fail(
+                            f"the range {part} is longer than the {listed} ideas listed"
+                        )
+                    positions.extend(range(start, end + 1))
+                else:
+                    positions.append(int(part))
+        except ValueError:
+            self.fail(f"{value!r} is not a list of positions such as 3, 1,5,9 or 2-7")
+        if not positions:
+            self.fail("no positions given")
+        # drop duplicates but keep the order given
+        return [*dict.fromkeys(positions)]
+
+
+POSITIONS = PositionsType()
+
+
+class TagType(click.ParamType):
+    """
+    A tag: a word of letters, digits, "-" or "_", ignoring case and any leading
+    "#", e.g., "#Work" is the tag "work".
+    """
+
+    name = "tag"
+
+    def convert(self, value, param, ctx):
+        tag = value.strip().lstrip("#").lower()
+        if not re.fullmatch(r"[\w-]+", tag):
+            self.fail(f"{value!r} is not a tag such as work or to-do")
+        return tag
+
+
+TAG = TagType()
+
 
 @shell(prompt="app> ", intro="Welcome to the idea shell!")
 def cli():
@@ -120,56 +230,178 @@ def update_tmp_home(tmp_home: str = ""):
         console.print(f"[yellow]Temporary home directory not in use[/yellow]")
 
 
+# lines that batch runs in one transaction by default
+batch_chunk_size = 500
+# commands that need the terminal or would nest batches
+batch_excluded = ["edit", "e", "watch", "batch"]
+
+
 @cli.command("batch")
-@click.argument("file_path", required=True)
-def process_batch_file(file_path: str):
-    """Process commands from a batch file containing one command with any necessary arguments on each line."""
-    runner = CliRunner()
-
-    with open(file_path, "r") as file:
-        for line in file:
-            command = line.strip()
-            if command:
-                try:
-                    print(f"Executing command: {command}")
-
-                    # Use shlex.split to parse the command line
-                    args = shlex.split(command)
-
-                    # Pass the parsed command to the CLI runner
-                    result = runner.invoke(cli, args)
-
-                    # Check for errors in the result
-                    if result.exception:
-                        console.print(
-                            f"[red]Error executing command: {result.exception}[/red]"
+@click.argument("file", type=click.File("r"))
+@click.option(
+    "--chunk-size",
+    type=click.IntRange(1),
+    default=batch_chunk_size,
+    show_default=True,
+    help="lines run in each transaction",
+)
+@click.option(
+    "--keep-going",
+    is_flag=True,
+    help="report lines that fail and go on rather than stop at the first",
+)
+@click.pass_context
+def process_batch_file(ctx, file, chunk_size: int, keep_going: bool):
+    """Process commands from FILE containing one command with any necessary
+    arguments on each line. With FILE given as "-" the commands are read from
+    standard input as they arrive, e.g., "generate.py | idea batch -". Each line
+    runs as it is read, in transactions of up to --chunk-size lines that also
+    commit when no further line has arrived yet, with the output of the
+    commands suppressed and progress shown instead. A failing line is rolled
+    back.
+    """
+    global console
+    screen = console
+    # progress goes to standard error so that it is seen however stdout is piped
+    status = Console(stderr=True)
+    try:
+        total = os.fstat(file.fileno()).st_size or None
+    except (OSError, ValueError):
+        total = None
+    progress = Progress(
+        SpinnerColumn(),
+        TextColumn("{task.fields[lines]:,} lines"),
+        TextColumn("{task.fields[rate]:,.0f}/s"),
+        BarColumn(),
+        TimeElapsedColumn(),
+        TimeRemainingColumn(),
+        TextColumn("{task.fields[errors]:,} errors"),
+        console=status,
+    )
+    lines = errors = 0
+    stopped = False
+    cancelled = render_cancel.is_set()
+    # keep commands from printing or listing while the batch runs
+    console = Console(quiet=True)
+    render_cancel.set()
+    start = time.perf_counter()
+    try:
+        with progress, open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            task = progress.add_task("batch", total=total, lines=0, rate=0, errors=0)
+            numbered = enumerate(file, start=1)
+            item = next(numbered, None)
+            while item is not None and not stopped:
+                # a chunk also ends when the next line has yet to arrive so that
+                # the write lock is not held while waiting for it
+                with database.write_transaction(), database.defer_positions():
+                    for _ in range(chunk_size):
+                        number, line = item
+                        command = line.strip()
+                        try:
+                            _run_batch_line(command)
+                        except Exception as e:
+                            errors += 1
+                            message = (
+                                e.format_message()
+                                if isinstance(e, click.ClickException)
+                                else e
+                            )
+                            progress.console.print(
+                                f"[red]line {number}: {command}: {message}[/red]"
+                            )
+                            stopped = not keep_going
+                        lines += 1
+                        progress.update(
+                            task,
+                            advance=len(line.encode()),
+                            lines=lines,
+                            rate=lines / (time.perf_counter() - start),
+                            errors=errors,
                         )
-                    else:
-                        console.print(f"Success executing: {command}")
+                        item = None
+                        if stopped or not _input_waiting(file):
+                            break
+                        item = next(numbered, None)
+                        if item is None:
+                            break
+                if item is None and not stopped:
+                    item = next(numbered, None)
+    finally:
+        console = screen
+        if not cancelled:
+            render_cancel.clear()
+    elapsed = time.perf_counter() - start
+    status.print(
+        f"{lines:,} lines in {elapsed:.1f}s ({lines / elapsed if elapsed else 0:,.0f}/s)"
+        f"{f', stopped at the first error' if stopped else ''}"
+        f"{f', {errors:,} errors' if errors else ''}"
+    )
+    if errors:
+        ctx.exit(1)
+
+
+def _input_waiting(file) -> bool:
+    """
+    Whether more of file can be read without waiting, as is always the case for
+    a regular file but not for a pipe whose writer has yet to write more.
+    """
+    try:
+        return bool(select.select([file], [], [], 0)[0])
+    except (OSError, ValueError):
+        return True
 
-                except Exception as e:
-                    console.print(f"[red]Unexpected error: {e}[/red]")
-                    console.print(f"Executing command: {command = }; {args = }")
+
+def _run_batch_line(command: str):
+    """Run one line of a batch, raising an exception if it fails."""
+    args = shlex.split(command)
+    if not args:
+        return
+    if args[0] in batch_excluded:
+        raise click.UsageError(f"{args[0]} cannot run in a batch")
+    try:
+        cli.main(args=args, prog_name="idea", standalone_mode=False)
+    except RenderCancelled:
+        # the list that follows a change is skipped
+        pass
 
 
 @cli.command("find", short_help="Find ideas by name or content.")
 @click.argument("pattern", type=str)
-def find(pattern: str):
+@click.option(
+    "--fuzzy",
+    is_flag=True,
+    help="list the best matches for the words of PATTERN, allowing for typos",
+)
+@click.option("--json", "output", flag_value="json", help="write a JSON array")
+@click.option(
+    "--ndjson", "output", flag_value="ndjson", help="write a JSON object per line"
+)
+def find(pattern: str, fuzzy: bool, output: Optional[str]):
     """
-    Find ideas where name or content matches the given pattern.
+    Find ideas where name or content matches the given pattern. Like the show
+    and sort settings, the pattern is kept in the database for later lists, in
+    this and later sessions, until it is cleared with an empty pattern, find "".
+    With --fuzzy, instead list the ideas whose words best match those of the
+    pattern, best first, with their positions in the list, without changing
+    the pattern kept for later lists.
+    With --json or --ndjson, write the ideas found as JSON, with the score of
+    each match for --fuzzy.
     """
-    # Build the SQL filter condition
-    filter_condition = f"name LIKE '%{pattern}%' OR content LIKE '%{pattern}%'"
-
-    set_find((f"name or content LIKE {pattern}" if pattern else None))
-
-    # Recreate the view with the filter
-    create_view(filter_condition)
+    if fuzzy:
+        rows = get_fuzzy_matches(pattern)
+        if output:
+            _ranked_json(output, rows, "score")
+        else:
+            _list_ranked(rows, "match", f"{len(rows)} best matches for {pattern}")
+        return
+    # Store the pattern, which also rebuilds the positions with the filter
+    set_find(pattern if pattern else None)
 
     # Display the filtered rows
-    conn = sqlite3.connect(db_path)
-    # rows = conn.execute("SELECT * FROM idea_positions").fetchall()
-    _list_all()
+    if output:
+        _list_json(output)
+    else:
+        _list_all()
 
 
 @cli.command("set-home")
@@ -219,14 +451,14 @@ def set_home(home):
 @click.option(
     "--added",
     type=int,
-    default=timestamp(),
-    help="added timestamp in seconds since the epoch",
+    default=None,
+    help="added timestamp in seconds since the epoch, by default now",
 )
 @click.option(
     "--probed",
     type=int,
-    default=timestamp(),
-    help="probed timestamp in seconds since the epoch",
+    default=None,
+    help="probed timestamp in seconds since the epoch, by default now",
 )
 @click.pass_context
 def add_alias(ctx, name, content, status, state, added, probed):
@@ -252,27 +484,31 @@ def add_alias(ctx, name, content, status, state, added, probed):
 @click.option(
     "--added",
     type=int,
-    default=timestamp(),
-    help="added timestamp in seconds since the epoch",
+    default=None,
+    help="added timestamp in seconds since the epoch, by default now",
 )
 @click.option(
     "--probed",
     type=int,
-    default=timestamp(),
-    help="probed timestamp in seconds since the epoch",
+    default=None,
+    help="probed timestamp in seconds since the epoch, by default now",
 )
 def add(
     name: str,
     content: str = "",
     status: str = "inkling",
     state: str = "active",
-    added: int = timestamp(),
-    probed: int = timestamp(),
+    added: int = None,
+    probed: int = None,
 ):
     """Add a new idea with NAME and, optionally, CONTENT."""
+    # not option defaults, which are evaluated once when a shell or daemon starts
+    now = timestamp()
+    added = now if added is None else added
+    probed = now if probed is None else probed
     print(f"Adding idea with name: {name} and content: {content}")
     full_name = " ".join(name)
-    insert_idea(
+    idea_id = insert_idea(
         name=full_name,
         content=content,
         status=status_str_to_pos[status],
@@ -281,6 +517,10 @@ def add(
         probed=probed,
     )
     _list_all()
+    for _, dupe_name, similarity in get_likely_duplicates(idea_id):
+        console.print(
+            f"[yellow]{full_name} may duplicate {dupe_name} ({similarity:.0%} similar)[/yellow]"
+        )
 
 
 def update(
@@ -306,80 +546,82 @@ def update(
     _list_all()
 
 
-@cli.command(short_help="Toggles state status between paused and active for idea")
-@click.argument("position", type=int)
-def pause(position: int):
-    """If idea at POSITION is active then pause it else if paused then activate it. When an idea is paused the times since added and since probed are saved and then restored when/if the idea is activated again."""
-    position = int(position)
-    idea = get_idea_by_position(position)
-    # click_log(f"{idea = }")
-    if idea:
-        id, name, status, state, added, probed, content_ = idea
-        # click_log(f"{state = }; {type(state) = }")
-        now = timestamp()
-        new_added = now - added
-        new_probed = now - probed
-        new_state = 0 if state == 1 else 1
-
-        # click_log(f"{new_added = }; {added = }; {new_probed = }; {probed = }; {now = }")
-        update_idea(
-            position,
-            None,
-            None,
-            None,
-            new_state,  # state 1 -> 0
-            new_added,  # to restore later
-            new_probed,  # to restore later
-        )
+@cli.command(short_help="Toggles state status between paused and active for ideas")
+@click.argument("positions", type=POSITIONS)
+def pause(positions: List[int]):
+    """For each idea at POSITIONS, if the idea is active then pause it else if paused then activate it. When an idea is paused the times since added and since probed are saved and then restored when/if the idea is activated again. POSITIONS can be a single position, a comma separated list or a range, e.g., "3", "1,5,9" or "2-7"."""
+    if toggle_pause(positions):
         _list_all()
-    else:
-        console.print(f"[red]Idea at position {position} not found![/red]")
 
 
-@cli.command(short_help="Updates the value of status for idea")
-@click.argument("position", type=int)  # Second required argument
+@cli.command(short_help="Updates the value of status for ideas")
+@click.argument("positions", type=POSITIONS)  # Second required argument
 @click.argument(
     "status",
     type=click.Choice([r for r in status_names]),  # Constrain "status" to valid choices
 )
-def status(position: int, status: str):
-    """Set the value of status for idea at POSITION."""
-    idea = get_idea_by_position(position)
-    if idea:
-        # click_log(f"{idea = }")
-        id, name, old_status, state, added, probed, content_ = idea
-        new_status = status_str_to_pos[status]
-        if new_status == old_status:
-            console.print(
-                f"[red]The selected value of status, {status}, is unchanged from the current value.[/red]"
-            )
-            return
+def status(positions: List[int], status: str):
+    """Set the value of status for ideas at POSITIONS, e.g., "3", "1,5,9" or "2-7"."""
+    if set_status(positions, status_str_to_pos[status]):
+        _list_all()
+    else:
+        console.print(
+            f"[red]The selected value of status, {status}, is unchanged from the current value.[/red]"
+        )
 
-        # click_log(f"{status = }")
 
-        update_idea(
-            position,
-            None,
-            None,
-            new_status,
-            None,  # state 1 -> 0
-            None,  # to restore later
-            timestamp(),  # to restore later
-        )
+@cli.command(short_help="Deletes ideas at POSITIONS")
+@click.argument("positions", type=POSITIONS)
+def delete(positions: List[int]):
+    """Delete the ideas at POSITIONS, e.g., "3", "1,5,9" or "3-40"."""
+    if delete_ideas(positions):
+        # Refresh the list to reflect changes
         _list_all()
-    else:
-        console.print(f"[red]Idea at position {position} not found![/red]")
 
 
-@cli.command(short_help="Deletes idea at POSITION")
-@click.argument("position", type=int)
-def delete(position):
-    """Delete an idea at POSITION."""
-    # Print debug information
-    # Call the database function to handle the deletion
-    delete_idea(position)
-    # Refresh the list to reflect changes
-    _list_all()
+@cli.command(short_help="Marks ideas as probed now")
+@click.argument("positions", type=POSITIONS)
+def review(positions: List[int]):
+    """Reset the time since probed for ideas at POSITIONS, e.g., "3", "1,5,9" or "2-7"."""
+    if review_ideas(positions):
+        _list_all()
+
+
+@cli.command(short_help="Adds tags to ideas")
+@click.argument("positions", type=POSITIONS)
+@click.argument("tags", type=TAG, nargs=-1, required=True)
+def tag(positions: List[int], tags: Tuple[str]):
+    """Add TAGS to the ideas at POSITIONS, e.g., "tag 1,5 work later". List
+    the ideas with a tag with "list --tag work".
+    """
+    added = tag_ideas(positions, [*tags])
+    console.print(f"Added {added} tag{'' if added == 1 else 's'}")
+
+
+@cli.command(short_help="Removes tags from ideas")
+@click.argument("positions", type=POSITIONS)
+@click.argument("tags", type=TAG, nargs=-1, required=True)
+def untag(positions: List[int], tags: Tuple[str]):
+    """Remove TAGS from the ideas at POSITIONS, e.g., "untag 3-7 later"."""
+    removed = untag_ideas(positions, [*tags])
+    console.print(f"Removed {removed} tag{'' if removed == 1 else 's'}")
+
+
+@cli.command(short_help="Lists tags and how many ideas have each")
+def tags():
+    """List the tags in use and the number of ideas with each."""
+    counts = get_tag_counts()
+    table = Table(
+        show_header=True,
+        header_style="#87CEFA",
+        box=box.HEAVY_EDGE,
+        caption=f"{len(counts)} tags",
+    )
+    table.add_column("tag", min_width=10)
+    table.add_column("ideas", justify="right")
+    for name, n in counts:
+        table.add_row(name, f"{n:,}")
+    console.print(table)
 
 
 @cli.command(short_help="Show ideas based on their status names")
@@ -428,28 +670,139 @@ def hide(types: str):
     _list_all()
 
 
+@cli.command(short_help="Sets the order of the list")
+@click.argument("mode", type=click.Choice(sort_modes))
+def sort(mode: str):
+    """List ideas in the order given by MODE, which is kept for later lists:
+    name (the default), age (oldest first), idle (longest since probed first)
+    or status. Paused ideas are listed before active ones in each mode.
+    """
+    set_sort(mode)
+    _list_all()
+
+
 @cli.command("l", short_help="Alias for list")
-def list_alias(short_help="Lists aliases"):
+@click.option("--tag", "tags", type=TAG, multiple=True)
+@click.option("--exclude", type=TAG, multiple=True)
+@click.option("--plain", "output", flag_value="plain")
+@click.option("--json", "output", flag_value="json")
+@click.option("--ndjson", "output", flag_value="ndjson")
+@click.pass_context
+def list_alias(ctx, tags, exclude, output):
     """Alias for "list". Lists all ideas satisfying the current find and show settings."""
-    _list_all()
+    ctx.forward(list)
 
 
 @cli.command(short_help="Lists ideas")
-def list():
+@click.option(
+    "--tag",
+    "tags",
+    type=TAG,
+    multiple=True,
+    help="only ideas with this tag; may be repeated",
+)
+@click.option(
+    "--exclude",
+    type=TAG,
+    multiple=True,
+    help="only ideas without this tag; may be repeated",
+)
+@click.option(
+    "--plain",
+    "output",
+    flag_value="plain",
+    help="write a line for each idea as it is read rather than a table",
+)
+@click.option("--json", "output", flag_value="json", help="write a JSON array")
+@click.option(
+    "--ndjson", "output", flag_value="ndjson", help="write a JSON object per line"
+)
+def list(tags: Tuple[str], exclude: Tuple[str], output: Optional[str]):
     """List all ideas satisfying the current find and show settings.
     The POSITION number in the first column is used to specify an idea in commands,
     e.g., "details 3" to see the details of an idea at POSITION 3. The age and idle
     columns refer to how long ago the idea was, repectively, added or last probed/modified.
+    With --tag and --exclude, only the ideas with every --tag and no --exclude tag
+    are listed, keeping their positions, e.g., "list --tag work --exclude later".
+    With --plain, each idea is written as soon as it is read as a line of fixed
+    width columns, colored when writing to a terminal, rather than in a table
+    that can only be drawn once every idea has been read. The first lines of a
+    long list then come at once. With --json or --ndjson, the ideas are written
+    as they are read as JSON for scripts, see _idea_record.
     """
-    _list_all()
+    if output == "plain":
+        _list_plain([*tags], [*exclude])
+    elif output:
+        _list_json(output, [*tags], [*exclude])
+    else:
+        _list_all([*tags], [*exclude])
 
 
-def _list_all():
-    """List all ideas based on the current view settings."""
-    # Fetch filtered ideas
-    ideas, show_list = get_ideas_from_view()
-    # click_log(f"{ideas = }; {show_list = }")
+@cli.command(short_help="Keeps the list on screen and up to date")
+@click.option(
+    "--interval",
+    type=click.FloatRange(min=0.1),
+    default=1.0,
+    show_default=True,
+    help="seconds between checks for changes",
+)
+def watch(interval: float):
+    """Show as much of the list as fits on the screen and keep it current until
+    Ctrl-C. The ideas are read again only when another session or process has
+    changed the database and the screen is redrawn only when they changed or
+    when the age or idle of a listed idea moves on to another value or color.
+    """
+    token = height = None
+    rows = cells = None
+    with Live(console=console, screen=True, auto_refresh=False) as live:
+        try:
+            while True:
+                current = get_change_token()
+                if current != token or console.height != height:
+                    token, height = current, console.height
+                    ideas, show_list = get_ideas_from_view()
+                    # the header, borders and caption take six lines
+                    rows = [*itertools.islice(ideas, max(height - 6, 1))]
+                    ideas.close()
+                    caption = f"showing {get_view_count():,} of {get_total():,} ideas{_view_caption(show_list)}"
+                    cells = None
+                new_cells = [
+                    _age_idle(idea.status, idea.state, idea.added, idea.probed)
+                    for idea in rows
+                ]
+                if new_cells != cells:
+                    cells = new_cells
+                    table = _list_table()
+                    for idx, (idea, (age, idle)) in enumerate(
+                        zip(rows, cells), start=1
+                    ):
+                        table.add_row(*_list_row(idx, idea, age, idle))
+                    table.caption = caption
+                    live.update(
+                        Group(Text.from_markup(" 💡[#87CEFA]Idea[/#87CEFA]"), table),
+                        refresh=True,
+                    )
+                # stop as the list commands do when a newer command cancels rendering
+                if render_cancel.wait(interval):
+                    raise RenderCancelled()
+        except KeyboardInterrupt:
+            pass
+
+
+def _age_idle(status: int, state: int, added: int, probed: int) -> Tuple[str, str]:
+    """Colored age and idle cells for an active idea or "~" for a paused one."""
+    if state == 1:
+        now = timestamp()
+        age = f"{format_age_color(now - added, num=2, color_type=status)}"
+        idle = f"{format_idle_color(now - probed, num=2, color_type=status)}"
+    else:
+        idle = "~"
+        age = "~"
+    return age, idle
 
+
+def _view_caption(show_list: List[int]) -> str:
+    """The part of the list caption describing the find and show settings."""
     hide = []
 
     if show_list:
@@ -469,29 +822,38 @@ def _list_all():
     hiding = f"hiding ideas with status {hide_str}" if hide_str else ""
 
     find = get_find()
-    showing = f"showing ideas with {find}" if find else ""
+    showing = f"with name or content LIKE {find}" if find else ""
 
     # click_log(f"showing = '{showing}'; hiding = '{hiding}'")
 
+    sort = get_sort()
+    sorted_by = f" by {sort}" if sort != sort_modes[0] else ""
+
+    # completed with the counts once the rows have been added
     if showing and hiding:
-        caption = f"{showing} but {hiding}"
+        return f"{sorted_by} {showing} but {hiding}"
     elif showing:
-        caption = showing
+        return f"{sorted_by} {showing}"
     elif hide_str:
-        caption = hiding
+        return f"{sorted_by} but {hiding}"
     else:
-        caption = ""
+        return sorted_by
 
-    # Render the table
-    console.clear()
-    console.print(f" 💡[#87CEFA]Idea[/#87CEFA]")
+
+def _tags_caption(tags: List[str], exclude: List[str]) -> str:
+    """The part of the list caption describing the tags listed."""
+    with_tags = f" tagged {' and '.join(tags)}" if tags else ""
+    without = f" not tagged {' or '.join(exclude)}" if exclude else ""
+    return f"{with_tags}{' but' if tags and exclude else ''}{without}"
+
+
+def _list_table() -> Table:
     table = Table(
         show_header=True,
         # header_style="bold blue",
         header_style="#87CEFA",
         expand=True,
         box=box.HEAVY_EDGE,
-        caption=caption,
     )
     table.add_column("#", style="dim", min_width=1, justify="right")
     table.add_column("name", min_width=24)
@@ -499,23 +861,584 @@ def _list_all():
     table.add_column("status", width=6, justify="center")
     table.add_column("added", width=6, justify="center")
     table.add_column("probed", width=6, justify="center")
+    return table
 
-    for idx, idea in enumerate(ideas, start=1):
-        # click_log(f"{idx = }; {idea = }; {type(idea) = }")
-        id_, name, status, state, added_, probed_, position_ = idea
-        # click_log(f"{id_ = }; {name = }; {status = }")
-        if state == 1:
-            age = f"{format_age_color(timestamp() - added_, num=2, color_type=status)}"
-            idle = (
-                f"{format_idle_color(timestamp() - probed_, num=2, color_type=status)}"
-            )
+
+def _list_row(idx: int, idea, age: str, idle: str) -> List[str]:
+    return [
+        str(idx),
+        f"[{status_colors[idea.status]}]{idea.name}",
+        # f"[{state_colors[idea.state]}]{state_pos_to_str[idea.state]}",
+        f"[{status_colors[idea.status]}]{status_pos_to_str[idea.status]}",
+        f"{age}",
+        f"{idle}",
+    ]
+
+
+def _list_all(tags: List[str] = (), exclude: List[str] = ()):
+    """
+    List all ideas based on the current view settings and, if given, only those
+    with every one of tags and none of exclude. The rows stream from the
+    database, but the table holds the cells of every row until it is printed,
+    so memory still grows with the list; list --plain prints each line as it
+    is read instead.
+    """
+    if render_cancel.is_set():
+        raise RenderCancelled()
+    # Fetch filtered ideas
+    ideas, show_list = get_ideas_from_view(tags, exclude)
+    # click_log(f"{ideas = }; {show_list = }")
+    caption = _view_caption(show_list) + _tags_caption(tags, exclude)
+
+    # Render the table
+    console.clear()
+    console.print(f" 💡[#87CEFA]Idea[/#87CEFA]")
+    table = _list_table()
+
+    # rows are added as they stream from the cursor so that the fetched rows are
+    # not held as well as the table
+    for idea in ideas:
+        if render_cancel.is_set():
+            raise RenderCancelled()
+        # click_log(f"{idea.position = }; {idea.id = }; {idea.name = }")
+        age, idle = _age_idle(idea.status, idea.state, idea.added, idea.probed)
+        # the position in the view, which a tag filter leaves gaps in
+        table.add_row(*_list_row(idea.position, idea, age, idle))
+    if render_cancel.is_set():
+        raise RenderCancelled()
+    table.caption = f"showing {table.row_count:,} of {get_total():,} ideas{caption}"
+    console.print(table)
+
+
+# widths of the status, added and probed columns of list --plain
+plain_widths = [7, 8, 8]
+plain_reset = "\x1b[0m"
+
+
+@functools.lru_cache(maxsize=None)
+def _plain_color(color: str) -> str:
+    """The escape sequence that sets the foreground to color, e.g., "#87CEFA"."""
+    red, green, blue = (int(color[i : i + 2], 16) for i in (1, 3, 5))
+    return f"\x1b[38;2;{red};{green};{blue}m"
+
+
+def _list_plain(tags: List[str] = (), exclude: List[str] = ()):
+    """
+    Write the ideas of _list_all one line at a time as they stream from the
+    cursor. The columns have fixed widths that fit the console, names cut to
+    fit, so no line waits on the rows after it.
+    """
+    if render_cancel.is_set():
+        raise RenderCancelled()
+    ideas, show_list = get_ideas_from_view(tags, exclude)
+    caption = _view_caption(show_list) + _tags_caption(tags, exclude)
+    out = console.file
+    colored = console.is_terminal and not console.no_color
+
+    def paint(text: str, color: str) -> str:
+        return f"{_plain_color(color)}{text}{plain_reset}" if colored else text
+
+    position_width = len(str(get_view_count()))
+    # two spaces between columns
+    name_width = max(
+        console.width - position_width - sum(plain_widths) - 2 * len(plain_widths) - 2,
+        10,
+    )
+    status_width, age_width, idle_width = plain_widths
+    out.write(
+        paint(
+            f"{'#':>{position_width}}  {set_cell_size('name', name_width)}  "
+            f"{'status':^{status_width}}  {'added':>{age_width}}  "
+            f"{'probed':>{idle_width}}",
+            "#87CEFA",
+        )
+        + "\n"
+    )
+    out.flush()
+    now = timestamp()
+    count = 0
+    for idea in ideas:
+        if render_cancel.is_set():
+            raise RenderCancelled()
+        color = status_colors[idea.status]
+        if idea.state == 1:
+            age = format_timedelta(now - idea.added, num=2)
+            idle = format_timedelta(now - idea.probed, num=2)
+            age_color = get_age_color(idea.status, now - idea.added)
+            idle_color = get_idle_color(idea.status, now - idea.probed)
         else:
-            idle = "~"
-            age = "~"
+            age = idle = "~"
+            age_color = idle_color = color
+        out.write(
+            f"{idea.position:>{position_width}}  "
+            f"{paint(set_cell_size(idea.name, name_width), color)}  "
+            f"{paint(f'{status_pos_to_str[idea.status]:^{status_width}}', color)}  "
+            f"{paint(f'{age:>{age_width}}', age_color)}  "
+            f"{paint(f'{idle:>{idle_width}}', idle_color)}\n"
+        )
+        count += 1
+    out.write(f"showing {count:,} of {get_total():,} ideas{caption}\n")
+    out.flush()
+
+
+def _idea_record(
+    id: int, name: str, status: int, state: int, added: int, probed: int, now: int
+) -> dict:
+    """
+    An idea as written by --json and --ndjson: status and state by name, added
+    and probed as timestamps and age and idle as the seconds since them. Paused
+    ideas store the seconds since added and probed instead, which become
+    timestamps as of now. Scripts should key on id, which never changes, rather
+    than on any position written with it, which changes with the list.
+    """
+    if state == 1:
+        age, idle = now - added, now - probed
+    else:
+        age, idle = added, probed
+        added, probed = now - age, now - idle
+    return {
+        "id": id,
+        "name": name,
+        "status": status_pos_to_str[status],
+        "state": state_pos_to_str[state],
+        "added": added,
+        "probed": probed,
+        "age": age,
+        "idle": idle,
+    }
+
+
+def _write_json(output: str, records: Iterator[dict]):
+    """
+    Write records to the console's file, bypassing Rich, one at a time as they
+    come: as a JSON array for output "json" or an object per line for "ndjson".
+    """
+    out = console.file
+    start = "["
+    for record in records:
+        if render_cancel.is_set():
+            raise RenderCancelled()
+        line = json.dumps(record, ensure_ascii=False)
+        if output == "ndjson":
+            out.write(f"{line}\n")
+        else:
+            out.write(f"{start}{line}")
+            start = ",\n"
+    if output == "json":
+        out.write("[]\n" if start == "[" else "]\n")
+    out.flush()
+
+
+def _list_json(output: str, tags: List[str] = (), exclude: List[str] = ()):
+    """Write the ideas of _list_all with their positions as JSON."""
+    if render_cancel.is_set():
+        raise RenderCancelled()
+    ideas, _ = get_ideas_from_view(tags, exclude)
+    now = timestamp()
+    _write_json(
+        output,
+        (
+            {
+                "position": idea.position,
+                **_idea_record(
+                    idea.id,
+                    idea.name,
+                    idea.status,
+                    idea.state,
+                    idea.added,
+                    idea.probed,
+                    now,
+                ),
+            }
+            for idea in ideas
+        ),
+    )
+
+
+def _ranked_json(output: str, rows: List[Tuple], score_label: str):
+    """
+    Write the rows of _list_ranked as JSON. The id identifies each idea for
+    good; position is where it is in the list when written, or null if find or
+    show hide it, and goes stale as soon as the list changes.
+    """
+    positions = get_view_positions([row[0] for row in rows])
+    now = timestamp()
+    _write_json(
+        output,
+        [
+            {
+                **_idea_record(id_, name, status, state, added_, probed_, now),
+                "position": positions.get(id_),
+                score_label: score,
+            }
+            for id_, name, status, state, added_, probed_, score in rows
+        ],
+    )
+
+
+# upper limits in days and labels for the age histogram in stats
+age_buckets = [1, 3, 7, 14, 30, 91, 365]
+age_bucket_labels = ["<1d", "1-3d", "3d-1w", "1-2w", "2w-1m", "1-3m", "3m-1y", ">1y"]
+
+
+@cli.command(short_help="Shows counts of ideas by status, state and age")
+def stats():
+    """Show the number of ideas for each status and state and, for active ideas,
+    how many fall into each age range. The counts come from summary tables kept
+    current as ideas change, so this is quick however many ideas there are.
+    """
+    counts = {(status, state): n for status, state, n in get_counts()}
+    table = Table(
+        show_header=True,
+        header_style="#87CEFA",
+        expand=True,
+        box=box.HEAVY_EDGE,
+        title="ideas by status and state",
+    )
+    table.add_column("status", min_width=10)
+    for state in reversed(valid_state):
+        table.add_column(state_pos_to_str[state], justify="right")
+    table.add_column("total", justify="right")
+    for status in valid_status:
+        cells = [counts.get((status, state), 0) for state in reversed(valid_state)]
+        table.add_row(
+            f"[{status_colors[status]}]{status_pos_to_str[status]}",
+            *[f"{n:,}" for n in cells],
+            f"{sum(cells):,}",
+        )
+    totals = [
+        sum(counts.get((status, state), 0) for status in valid_status)
+        for state in reversed(valid_state)
+    ]
+    table.add_row("total", *[f"{n:,}" for n in totals], f"{sum(totals):,}")
+
+    histogram = {
+        (status, i): 0 for status in valid_status for i in range(len(age_bucket_labels))
+    }
+    today = timestamp() // 86400
+    for status, day, n in get_added_days():
+        histogram[(status, bisect.bisect_right(age_buckets, today - day))] += n
+    ages = Table(
+        show_header=True,
+        header_style="#87CEFA",
+        expand=True,
+        box=box.HEAVY_EDGE,
+        title="active ideas by age",
+    )
+    ages.add_column("status", min_width=10)
+    for label in age_bucket_labels:
+        ages.add_column(label, justify="right")
+    for status in valid_status:
+        ages.add_row(
+            f"[{status_colors[status]}]{status_pos_to_str[status]}",
+            *[f"{histogram[(status, i)]:,}" for i in range(len(age_bucket_labels))],
+        )
+    console.print(table)
+    console.print(ages)
+
+
+@cli.command(short_help="Writes the in-memory working set to disk")
+def flush():
+    """With IDEAMEMORY set, the ideas are loaded into memory at startup and
+    changes are written back to disk every 30 seconds and on exit. Write them
+    now instead.
+    """
+    try:
+        written = flush_working_set()
+    except (DiskChangedError, sqlite3.Error) as e:
+        console.print(f"[red]{e}[/red]")
+        return
+    if written is None:
+        console.print(
+            "[yellow]Not in memory mode: changes are already on disk[/yellow]"
+        )
+    elif written:
+        console.print("Flushed the working set to disk")
+    else:
+        console.print("Nothing to flush")
+
+
+@cli.command(short_help="Analyzes and vacuums the database")
+@click.option("--full", is_flag=True, help="analyze every table and rewrite the file")
+def maintain(full: bool):
+    """Update the statistics the query planner uses and, when many pages of the
+    database file are free after deletes, return them to the file system. The
+    async shell and the daemon do this by themselves after they have been idle
+    for a while. With --full, analyze every table and VACUUM to rewrite the
+    file compactly.
+    """
+    try:
+        report = run_maintenance(full=full)
+    except sqlite3.Error as e:
+        console.print(f"[red]{e}[/red]")
+        return
+    console.print(
+        f"{', '.join(report.actions)} in {report.seconds:.2f}s: "
+        f"{report.free_pages:,} of {report.pages:,} pages were free, "
+        f"reclaimed {report.reclaimed:,} bytes"
+    )
+
+
+@cli.command(short_help="Lists overdue and idle ideas")
+def due():
+    """List the active ideas that are overdue for their status or have been idle
+    too long, most late first. The late column gives how long ago the idea
+    became due and the # column its position in the list, e.g., "review 4" to
+    probe the idea listed as 4, in this or any later command. Ideas that find
+    or show hide from the list have no position.
+    """
+    now = timestamp()
+    rows = get_due_ideas(*due_cutoffs(now))
+    positions = get_view_positions([row[0] for row in rows])
+
+    console.clear()
+    console.print(f" 💡[#87CEFA]Idea[/#87CEFA]")
+    table = Table(
+        show_header=True,
+        header_style="#87CEFA",
+        expand=True,
+        box=box.HEAVY_EDGE,
+        caption=f"{len(rows)} ideas due",
+    )
+    table.add_column("#", style="dim", min_width=1, justify="right")
+    table.add_column("name", min_width=24)
+    table.add_column("status", width=6, justify="center")
+    table.add_column("late", width=6, justify="center")
+    table.add_column("due", width=6, justify="center")
+    for id_, name, status, state, added_, probed_, late, overdue, idle in rows:
+        why = " ".join(
+            label for label, flag in (("overdue", overdue), ("idle", idle)) if flag
+        )
+        table.add_row(
+            str(positions.get(id_, "")),
+            f"[{status_colors[status]}]{name}",
+            f"[{status_colors[status]}]{status_pos_to_str[status]}",
+            f"[{alert_color}]{format_timedelta(late, num=2)}",
+            why,
+        )
+    console.print(table)
+
+
+@cli.command(short_help="Shows when ideas were added, reviewed and changed")
+@click.argument("position", type=int, required=False)
+@click.option(
+    "--days",
+    type=click.IntRange(1),
+    default=30,
+    show_default=True,
+    help="how many days back to look",
+)
+def history(position: Optional[int], days: int):
+    """Without POSITION, count the events of all ideas on each of the last DAYS
+    days: ideas added, reviewed, edited, given a new status, paused and
+    activated. With POSITION, list the events of the idea at POSITION in the
+    last DAYS days, newest first, followed by the monthly counts of its events
+    from before the last year.
+    """
+    table = Table(
+        show_header=True,
+        header_style="#87CEFA",
+        expand=True,
+        box=box.HEAVY_EDGE,
+    )
+    if position is None:
+        counts = {}
+        for day, kind, n in get_activity(days):
+            counts.setdefault(day, [0] * len(event_kinds))[kind] = n
+        table.title = f"events in the last {days} days"
+        table.add_column("day", min_width=10)
+        for kind in event_kinds:
+            table.add_column(kind, justify="right")
+        for day, cells in counts.items():
+            table.add_row(day, *[f"{n:,}" for n in cells])
+        console.print(table)
+        return
+
+    try:
+        idea_id = get_id_from_position(position)
+    except ValueError as e:
+        console.print(f"[red]{e}[/red]")
+        return
+    events, months = get_idea_history(idea_id, days)
+    now = timestamp()
+    table.title = f"events of the idea at position {position} in the last {days} days"
+    table.add_column("when", min_width=16)
+    table.add_column("ago", justify="right")
+    table.add_column("event")
+    for ts, kind in events:
+        table.add_row(
+            format_datetime(ts, "%Y-%m-%d %H:%M"),
+            format_timedelta(now - ts, num=2),
+            event_kinds[kind],
+        )
+    console.print(table)
+    if months:
+        counts = {}
+        for month, kind, n in months:
+            counts.setdefault(month, [0] * len(event_kinds))[kind] = n
+        older = Table(
+            show_header=True,
+            header_style="#87CEFA",
+            expand=True,
+            box=box.HEAVY_EDGE,
+            title="earlier events by month",
+        )
+        older.add_column("month", min_width=7)
+        for kind in event_kinds:
+            older.add_column(kind, justify="right")
+        for month, cells in counts.items():
+            older.add_row(
+                f"{month // 12}-{month % 12 + 1:02}", *[f"{n:,}" for n in cells]
+            )
+        console.print(older)
+
+
+@cli.command(short_help="Lists groups of ideas that are likely near duplicates")
+@click.option(
+    "--threshold",
+    type=click.FloatRange(0, 1),
+    default=minhash.default_threshold,
+    show_default=True,
+    help="least estimated similarity of the ideas in a group",
+)
+def dupes(threshold: float):
+    """List groups of ideas whose names and contents are nearly the same, largest
+    group first. The similar column gives the highest estimated similarity of
+    the idea to another in its group and the # column its position in the
+    list, which other commands take, e.g., "delete 12" to remove the idea
+    listed as 12. Ideas that find or show hide from the list have no position.
+    """
+    groups = get_duplicate_groups(threshold)
+    positions = get_view_positions([row[0] for group in groups for row in group])
+
+    console.clear()
+    console.print(f" 💡[#87CEFA]Idea[/#87CEFA]")
+    table = Table(
+        show_header=True,
+        header_style="#87CEFA",
+        expand=True,
+        box=box.HEAVY_EDGE,
+        caption=f"{sum(len(group) for group in groups)} ideas in {len(groups)} group{'' if len(groups) == 1 else 's'}",
+    )
+    table.add_column("#", style="dim", min_width=1, justify="right")
+    table.add_column("name", min_width=24)
+    table.add_column("status", width=6, justify="center")
+    table.add_column("similar", width=6, justify="center")
+    for group in groups:
+        for id_, name, status, state, added_, probed_, similarity in group:
+            table.add_row(
+                str(positions.get(id_, "")),
+                f"[{status_colors[status]}]{name}",
+                f"[{status_colors[status]}]{status_pos_to_str[status]}",
+                f"{similarity:.0%}",
+            )
+        table.add_section()
+    console.print(table)
+
+
+@cli.command(short_help="Lists the ideas most similar to an idea")
+@click.argument("position", type=int)
+@click.option(
+    "-n",
+    "--limit",
+    type=click.IntRange(1),
+    default=10,
+    show_default=True,
+    help="how many ideas to list",
+)
+def related(position: int, limit: int):
+    """List the ideas whose names and contents are most like those of the idea at
+    POSITION, most similar first, scored by the cosine similarity of their
+    TF-IDF vectors. The # column gives each idea's position in the list.
+    """
+    try:
+        idea_id = get_id_from_position(position)
+    except ValueError as e:
+        console.print(f"[red]{e}[/red]")
+        return
+    rows = get_related_ideas(idea_id, limit)
+    _list_ranked(
+        rows, "similar", f"{len(rows)} ideas related to the idea at position {position}"
+    )
+
+
+def _list_ranked(rows: List[Tuple], score_label: str, caption: str):
+    """
+    List (id, name, status, state, added, probed, score) rows in the given order
+    with the score as a percentage and, rather than their rank, the position of
+    each idea in the list, which other commands take in any later process.
+    Ideas that find or show hide from the list have no position.
+    """
+    positions = get_view_positions([row[0] for row in rows])
+    console.clear()
+    console.print(f" 💡[#87CEFA]Idea[/#87CEFA]")
+    table = Table(
+        show_header=True,
+        header_style="#87CEFA",
+        expand=True,
+        box=box.HEAVY_EDGE,
+        caption=caption,
+    )
+    table.add_column("#", style="dim", min_width=1, justify="right")
+    table.add_column("name", min_width=24)
+    table.add_column("status", width=6, justify="center")
+    table.add_column(score_label, width=6, justify="center")
+    for id_, name, status, state, added_, probed_, score in rows:
+        table.add_row(
+            str(positions.get(id_, "")),
+            f"[{status_colors[status]}]{name}",
+            f"[{status_colors[status]}]{status_pos_to_str[status]}",
+            f"{score:.0%}",
+        )
+    console.print(table)
+
+
+@cli.command(short_help="Lists or finds ideas across several homes")
+@click.option(
+    "-H",
+    "--home",
+    "homes",
+    multiple=True,
+    help="another idea home to include; may be repeated",
+)
+@click.option("--find", "pattern", help="only ideas whose name or content match")
+def federate(homes: Tuple[str], pattern: str):
+    """List the ideas of the current home together with those of the homes given
+    with --home and those listed in the IDEAHOMES environment variable, separated
+    as in PATH. With --find, only ideas whose name or content match PATTERN are
+    listed. Positions number the merged list and are not valid in other commands.
+    """
+    from modules.federation import federated_homes, federated_ideas
+
+    homes = federated_homes([*homes])
+    rows = federated_ideas(homes, pattern)
+
+    caption = f"{len(rows)} ideas from {len(homes)} homes"
+    if pattern:
+        caption += f" with name or content LIKE {pattern}"
+    console.clear()
+    console.print(f" 💡[#87CEFA]Idea[/#87CEFA]")
+    table = Table(
+        show_header=True,
+        header_style="#87CEFA",
+        expand=True,
+        box=box.HEAVY_EDGE,
+        caption=caption,
+    )
+    table.add_column("#", style="dim", min_width=1, justify="right")
+    table.add_column("home", style="dim", width=12)
+    table.add_column("name", min_width=24)
+    table.add_column("status", width=6, justify="center")
+    table.add_column("added", width=6, justify="center")
+    table.add_column("probed", width=6, justify="center")
+    for idx, (home, id_, name, status, state, added_, probed_) in enumerate(
+        rows, start=1
+    ):
+        age, idle = _age_idle(status, state, added_, probed_)
         table.add_row(
             str(idx),
+            home,
             f"[{status_colors[status]}]{name}",
-            # f"[{state_colors[state]}]{state_pos_to_str[state]}",
             f"[{status_colors[status]}]{status_pos_to_str[status]}",
             f"{age}",
             f"{idle}",
@@ -525,16 +1448,36 @@ def _list_all():
 
 @cli.command("i", short_help="Alias for info")
 @click.argument("position", type=int, required=False)
+@click.option("--json", "output", flag_value="json")
+@click.option("--ndjson", "output", flag_value="ndjson")
 @click.pass_context
-def info_alias(ctx, position):
+def info_alias(ctx, position, output):
     """Alias for info. If given, show details for idea at POSITION, else application information."""
     ctx.forward(info)
 
 
 @cli.command(short_help="Shows details for idea")
 @click.argument("position", type=int, required=False)
-def info(position):
-    """If given, show details for idea at POSITION, else application information."""
+@click.option(
+    "--json",
+    "output",
+    flag_value="json",
+    help="write the details as a JSON object",
+)
+@click.option(
+    "--ndjson",
+    "output",
+    flag_value="ndjson",
+    help="the same as --json, an object on one line",
+)
+def info(position, output):
+    """If given, show details for idea at POSITION, else application information.
+    With --json or --ndjson, write them as a JSON object on one line, including
+    the content and tags of the idea.
+    """
+    if output:
+        _info_json(position)
+        return
     if position is None:
         console.print(
             f"""\
@@ -552,6 +1495,7 @@ home:    [green]{idea_home}[/green]
 
     if idea:
         id, name, status, state, added, probed, content = idea
+        tags_str = ", ".join(get_idea_tags(id))
         status_str = (
             f"{status:<14} ({status_pos_to_str[status]})" if status is not None else ""
         )
@@ -581,7 +1525,8 @@ name:      {name}
 status:    {status_str}  
 state:     {state_str}    
 added:     {added_str}  
-probed:    {probed_str}\
+probed:    {probed_str}
+tags:      {tags_str}\
 """
 
         res = f"""\
@@ -595,6 +1540,27 @@ probed:    {probed_str}\
         console.print(f"[red]Idea at position {position} not found![/red]")
 
 
+def _info_json(position: Optional[int]):
+    """Write what info shows as a JSON object, raising an error for a bad position."""
+    if position is None:
+        record = {"version": version, "home": idea_home}
+    else:
+        try:
+            get_id_from_position(position)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        idea = get_idea_by_position(position)
+        if idea is None:
+            raise click.ClickException(f"Idea at position {position} not found")
+        record = {
+            "position": position,
+            **_idea_record(*idea[:6], timestamp()),
+            "content": idea.content,
+            "tags": get_idea_tags(idea.id),
+        }
+    _write_json("ndjson", [record])
+
+
 @cli.command("e", short_help="Alias for edit")
 @click.argument("position", type=int)
 @click.pass_context
@@ -614,28 +1580,16 @@ def edit(position: int):
         id, name, status, state, added_, probed_, content = idea
         new_name, new_content = edit_content_with_nvim(name, content)
         # click_log(f"{position = }; {id = }; {new_name = }; {new_content = }")
-        update_idea(position, new_name, new_content, None, None, None, timestamp())
-        _list_all()
-
-
-# @cli.command("review")
-# @click.argument("position", type=int)
-# def review(position):
-#     """
-#     Review the idea for a specific position.
-#     """
-#     click.echo(f"Reviewing idea at position {position}...")
-#
-#
-# @cli.command("re")  # Shortcut for "review"
-# @click.argument("position", type=int)
-# @click.pass_context
-# def review_shortcut(ctx, position):
-#     """
-#     Shortcut for the review command.
-#     """
-#     ctx.forward(review)
-#
+        if is_unchanged(id, new_name, new_content):
+            # nothing to write, and an unchanged idea has not been probed
+            _list_all()
+        elif update_idea(
+            position, new_name, new_content, None, None, None, timestamp()
+        ):
+            _list_all()
+        else:
+            # keep the edit visible so that it is not lost
+            console.print(Panel(f"{new_name}\n{new_content}", title="not saved"))
 
 
 def main():
@@ -646,6 +1600,25 @@ def main():
             sys.argv = [sys.argv[0]]  # Reset arguments to avoid conflict
             cli.main(prog_name="idea")
 
+        # Handle 'ashell' command
+        elif len(sys.argv) > 1 and sys.argv[1] == "ashell":
+            from modules.async_shell import run_async_shell
+
+            _list_all()
+            run_async_shell()
+
+        # Handle 'daemon' and 'daemon stop' commands
+        elif len(sys.argv) > 1 and sys.argv[1] == "daemon":
+            if sys.argv[2:] == ["stop"]:
+                from modules.client import stop_daemon
+
+                if not stop_daemon():
+                    console.print("[yellow]No idea daemon is running[/yellow]")
+            else:
+                from modules.daemon import run_daemon
+
+                run_daemon()
+
         # Default to Click's CLI
         else:
             cli.main(prog_name="idea")
@@ -0,0 +1,94 @@
+import sqlite3
+import time
+from typing import List, NamedTuple
+
+from modules.model import click_log
+
+# vacuum once free pages are more than this share of the file and at least
+# min_free_pages of them
+free_share = 0.1
+min_free_pages = 64
+# pages returned to the file system per incremental vacuum when idle so that a
+# command entered meanwhile does not wait long
+idle_vacuum_pages = 1024
+# the shell runs maintenance once it has waited this many seconds for input,
+# at most every idle_interval seconds
+idle_seconds = 60.0
+idle_interval = 3600.0
+# the value of PRAGMA auto_vacuum that allows incremental vacuums
+incremental = 2
+
+
+class Report(NamedTuple):
+    """What a maintenance run found and did."""
+
+    pages: int
+    free_pages: int
+    page_size: int
+    actions: List[str]
+    reclaimed: int
+    seconds: float
+
+
+def page_counts(conn: sqlite3.Connection) -> tuple:
+    """The page count, free page count, page size and auto_vacuum mode."""
+    return tuple(
+        conn.execute(f"PRAGMA {pragma}").fetchone()[0]
+        for pragma in ("page_count", "freelist_count", "page_size", "auto_vacuum")
+    )
+
+
+def needs_vacuum(pages: int, free_pages: int) -> bool:
+    return free_pages >= min_free_pages and free_pages > free_share * pages
+
+
+def run(conn: sqlite3.Connection, full: bool = False, idle: bool = False) -> Report:
+    """
+    Keep the database file compact and the planner's statistics current.
+
+    PRAGMA optimize always runs and analyzes the tables whose statistics are
+    missing or out of date; ANALYZE runs on every table if there are no
+    statistics at all, as for a database from before maintenance existed, or
+    with full. When free pages pass free_share of the file, an incremental
+    vacuum returns them, idle_vacuum_pages at a time when idle. A file created
+    before incremental vacuums were enabled is rewritten once by VACUUM to
+    enable them, but not when idle since that takes a while; full always runs
+    VACUUM.
+
+    Call outside of any transaction.
+    """
+    start = time.perf_counter()
+    pages, free_pages, page_size, auto_vacuum = page_counts(conn)
+    actions = []
+    has_stats = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE name = 'sqlite_stat1'"
+    ).fetchone()[0]
+    if full or not has_stats:
+        conn.execute("ANALYZE")
+        actions.append("analyze")
+    conn.execute("PRAGMA optimize")
+    actions.append("optimize")
+    if full or (needs_vacuum(pages, free_pages) and auto_vacuum != incremental):
+        if not idle:
+            conn.execute(f"PRAGMA auto_vacuum = {incremental}")
+            conn.execute("VACUUM")
+            actions.append("vacuum")
+    elif needs_vacuum(pages, free_pages):
+        step = idle_vacuum_pages if idle else free_pages
+        # execute would free a single page: the pragma frees one per step
+        conn.executescript(f"PRAGMA incremental_vacuum({step})")
+        actions.append("incremental vacuum")
+    reclaimed = max(pages - page_counts(conn)[0], 0) * page_size
+    report = Report(
+        pages,
+        free_pages,
+        page_size,
+        actions,
+        reclaimed,
+        time.perf_counter() - start,
+    )
+    click_log(
+        f"{', '.join(actions)} in {report.seconds:.3f}s reclaimed {reclaimed:,} bytes"
+        f" of {pages:,} pages with {free_pages:,} free"
+    )
+    return report
@@ -0,0 +1,68 @@
+import hashlib
+import random
+import re
+from array import array
+from typing import List, Optional
+
+# shingles are overlapping runs of this many characters of the normalized text
+shingle_size = 4
+# the signature is split into bands of rows_per_band minhashes; ideas that agree
+# on all the minhashes of any band share a bucket and become candidates. With
+# 16 bands of 4 a pair with similarity 0.5 is a candidate about 64% of the time
+# and one with similarity 0.8 over 99%.
+bands = 16
+rows_per_band = 4
+num_perm = bands * rows_per_band
+# candidates whose estimated similarity is at least this are reported
+default_threshold = 0.5
+
+_prime = (1 << 61) - 1
+_max_hash = (1 << 32) - 1
+# fixed so that signatures stored by one process match those of the next
+_rng = random.Random(5381)
+_perms = [
+    (_rng.randrange(1, _prime), _rng.randrange(0, _prime)) for _ in range(num_perm)
+]
+
+
+def _shingles(text: str) -> set:
+    text = re.sub(r"\s+", " ", text.lower()).strip()
+    if len(text) <= shingle_size:
+        return {text} if text else set()
+    return {text[i : i + shingle_size] for i in range(len(text) - shingle_size + 1)}
+
+
+def signature(name: Optional[str], content: Optional[str]) -> bytes:
+    """
+    The MinHash signature of the shingles of name and content: for each of
+    num_perm hash functions, the least hash of any shingle, packed as 32 bit
+    unsigned integers.
+    """
+    hashes = [
+        int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "little")
+        for s in _shingles(f"{name or ''} {content or ''}")
+    ]
+    if not hashes:
+        return array("I", [_max_hash] * num_perm).tobytes()
+    return array(
+        "I", [min((a * h + b) % _prime for h in hashes) & _max_hash for a, b in _perms]
+    ).tobytes()
+
+
+def band_buckets(sig: bytes) -> List[int]:
+    """The bucket of each band of sig as a signed 64 bit integer for sqlite."""
+    width = 4 * rows_per_band
+    return [
+        int.from_bytes(
+            hashlib.blake2b(sig[i : i + width], digest_size=8).digest(),
+            "little",
+            signed=True,
+        )
+        for i in range(0, len(sig), width)
+    ]
+
+
+def similarity(sig1: bytes, sig2: bytes) -> float:
+    """Estimate the Jaccard similarity of two signatures."""
+    a, b = array("I", sig1), array("I", sig2)
+    return sum(x == y for x, y in zip(a, b)) / num_perm
@@ -32,6 +32,7 @@ def click_log(msg: str):
     ts = timestamp()
     log_name = format_datetime(ts, "%Y-%m-%d.log")
 
+    os.makedirs(log_dir, exist_ok=True)
     # Format the log message
     with open(os.path.join(log_dir, log_name), "a") as debug_file:
         msg = f"\nclick_log {format_datetime(timestamp())} [{caller_name}]\n{msg}"
@@ -94,7 +95,7 @@ idle_colors = [
 def get_age_color(color_type: int, seconds: int):
     try:
         periods = round(seconds / oneperiod)  # days
-        late = min(max(periods - status_periods[color_type], 0), warning_periods)
+        late = min(max(periods - status_periods[color_type], 0), warning_periods - 1)
         color = status_colors[color_type][late]
         # click_log(f"got {color = } for {late = } and {color_type = }")
         return color
@@ -106,7 +107,7 @@ def get_age_color(color_type: int, seconds: int):
 def get_idle_color(color_type: int, seconds: int):
     try:
         hours = round(seconds / (60 * 60))  # hours instead of days
-        idle = min(hours, idle_hours)
+        idle = min(hours, idle_hours - 1)
         # click_log(
         #     f"{hours = }; {color_type = }; {idle = }; {len(idle_colors[color_type])}"
         # )
@@ -118,6 +119,21 @@ def get_idle_color(color_type: int, seconds: int):
         return "#FF3300"
 
 
+def due_cutoffs(now: int) -> Tuple[list[int], int]:
+    """
+    Return, for each status, the latest added timestamp at which an active idea
+    with that status is late, together with the latest probed timestamp at which
+    an active idea is idle. These match get_age_color, which starts warning once
+    the age rounds to more than status_periods periods, and get_idle_color, which
+    runs out of idle colors after idle_hours hours.
+    """
+    added_cutoffs = [
+        now - round((periods + 0.5) * oneperiod) for periods in status_periods
+    ]
+    probed_cutoff = now - idle_hours * 60 * 60
+    return added_cutoffs, probed_cutoff
+
+
 def is_valid_path(path):
     """
     Check if a given path is a valid directory.
@@ -265,6 +281,10 @@ def edit_content_with_nvim(name: str, content: str):
         name_and_content = tmp_file.read()
         lines = name_and_content.splitlines()
         new_name = lines.pop(0).strip()
+        # drop the blank line written after the name so that quitting without
+        # changes returns the content as it was
+        if lines and not lines[0].strip():
+            lines.pop(0)
         new_content = "\n".join(lines)
 
     # Cleanup
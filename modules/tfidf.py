@@ -0,0 +1,109 @@
+import functools
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+# common words that would make nearly every idea a candidate
+stop_words = frozenset(
+    """
+    a an and are as at be but by for from has have i if in into is it its of on
+    or so that the then there these this to was were what when which will with
+    """.split()
+)
+# terms in more than this share of the ideas are weighed but do not make other
+# ideas candidates
+candidate_df_share = 0.5
+
+
+@functools.lru_cache(maxsize=None)
+def _sparse():
+    """
+    numpy and scipy.sparse.csr_matrix, or None if either is missing. Imported
+    on first use rather than with this module since together they take longer
+    to import than most commands take to run.
+    """
+    try:
+        import numpy
+        from scipy.sparse import csr_matrix
+    except ImportError:  # scoring falls back to pure Python
+        return None
+    return numpy, csr_matrix
+
+
+def term_counts(name: str, content: str) -> Dict[str, int]:
+    """
+    The number of times each term occurs in name and content, where a term is
+    a run of letters and digits in any script, so "café" and "日本語" are terms.
+    """
+    words = re.findall(r"[^\W_]+", f"{name or ''} {content or ''}".lower())
+    return Counter(w for w in words if len(w) > 1 and w not in stop_words)
+
+
+def weight(n: int, df: int, total: int) -> float:
+    """Sublinear term frequency times smoothed inverse document frequency."""
+    return (1 + math.log(n)) * (math.log((1 + total) / (1 + df)) + 1)
+
+
+def candidate_terms(query: Dict[str, Tuple[int, int]], total: int) -> List[str]:
+    """The terms of query, as term -> (n, df), selective enough to find candidates."""
+    return [term for term, (n, df) in query.items() if df <= candidate_df_share * total]
+
+
+def top_k(
+    query: Dict[str, Tuple[int, int]],
+    postings: Iterable[Tuple[int, str, int, int]],
+    total: int,
+    k: int,
+) -> List[Tuple[int, float]]:
+    """
+    The k ideas most similar to query by the cosine of their TF-IDF vectors,
+    most similar first.
+
+    Args:
+        query: term -> (n, df) for the idea to match.
+        postings: (id, term, n, df) for every term of every candidate idea.
+        total: the number of ideas, for the inverse document frequency.
+    Returns:
+        List[Tuple[int, float]]: (id, cosine similarity) with similarity > 0.
+    """
+    q = {term: weight(n, df, total) for term, (n, df) in query.items()}
+    q_norm = math.sqrt(sum(w * w for w in q.values()))
+    if not q_norm:
+        return []
+    sparse = _sparse()
+    if sparse is not None:
+        return _top_k_sparse(q, q_norm, postings, total, k, *sparse)
+    dots = {}
+    norms = {}
+    for id, term, n, df in postings:
+        w = weight(n, df, total)
+        norms[id] = norms.get(id, 0.0) + w * w
+        if term in q:
+            dots[id] = dots.get(id, 0.0) + w * q[term]
+    scores = ((id, dot / (q_norm * math.sqrt(norms[id]))) for id, dot in dots.items())
+    return heapq.nlargest(k, scores, key=lambda x: x[1])
+
+
+def _top_k_sparse(
+    q, q_norm, postings, total, k, np, csr_matrix
+) -> List[Tuple[int, float]]:
+    """top_k with the candidates as rows of a sparse matrix."""
+    postings = [*postings]
+    if not postings:
+        return []
+    id_col, term_col, n_col, df_col = zip(*postings)
+    ids, row_index = np.unique(np.array(id_col, dtype=np.int64), return_inverse=True)
+    terms, col_index = np.unique(np.array(term_col), return_inverse=True)
+    n = np.array(n_col, dtype=np.float64)
+    df = np.array(df_col, dtype=np.float64)
+    data = (1 + np.log(n)) * (np.log((1 + total) / (1 + df)) + 1)
+    matrix = csr_matrix((data, (row_index, col_index)), shape=(len(ids), len(terms)))
+    q_vector = np.array([q.get(term, 0.0) for term in terms])
+    norms = np.sqrt(matrix.multiply(matrix).sum(axis=1)).A1
+    scores = matrix @ q_vector / (norms * q_norm)
+    k = min(k, len(ids))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [(int(ids[i]), float(scores[i])) for i in top if scores[i] > 0]
@@ -0,0 +1,21 @@
+from typing import Set
+
+# least similarity of a word of the pattern and a word of an idea for a match
+default_threshold = 0.3
+# how many of the best matches find --fuzzy lists
+default_limit = 50
+
+
+def trigrams(word: str) -> Set[str]:
+    """
+    The trigrams of word padded with two spaces before and one after, so that
+    the start of a word counts for more than its end, e.g., "cat" gives
+    "  c", " ca", "cat" and "at ".
+    """
+    padded = f"  {word} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(shared: int, word_trigrams: int, other_trigrams: int) -> float:
+    """The Jaccard similarity of two trigram sets given their sizes and overlap."""
+    return shared / (word_trigrams + other_trigrams - shared)
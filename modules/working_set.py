@@ -0,0 +1,336 @@
+import fcntl
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+from typing import List, Optional, Tuple
+
+from modules.model import click_log, timestamp
+
+# with IDEAMEMORY set to anything but 0 the database is loaded into memory at
+# startup and commands run against that working set
+enabled = os.environ.get("IDEAMEMORY", "") not in ("", "0")
+# seconds between writes of a changed working set back to disk
+flush_interval = 30.0
+# statements starting with these only read and are not logged
+_read_keywords = ("SELECT", "WITH", "PRAGMA")
+
+
+class DiskChangedError(Exception):
+    """Raised by flush when another session wrote to the database file."""
+
+
+def redo_path(db_path: str) -> str:
+    return f"{db_path}-redo"
+
+
+def base_hash(conn: sqlite3.Connection) -> str:
+    """
+    A digest of the pages of the main database of conn. The 100 byte header is
+    left out since it differs between a file in WAL mode and its copy in
+    memory, which have the same pages.
+    """
+    return hashlib.sha256(memoryview(conn.serialize())[100:]).hexdigest()
+
+
+def set_aside(path: str) -> str:
+    """Move the redo log at path where no session will replay it."""
+    kept = f"{path}.{timestamp()}"
+    os.replace(path, kept)
+    return kept
+
+
+def _encode(params):
+    if isinstance(params, dict):
+        return {k: _encode(v) for k, v in params.items()}
+    if isinstance(params, (list, tuple)):
+        return [_encode(v) for v in params]
+    if isinstance(params, bytes):
+        return {"$bytes": params.hex()}
+    return params
+
+
+def _decode(params):
+    if isinstance(params, dict):
+        if "$bytes" in params:
+            return bytes.fromhex(params["$bytes"])
+        return {k: _decode(v) for k, v in params.items()}
+    if isinstance(params, list):
+        return [_decode(v) for v in params]
+    return params
+
+
+class RedoLog:
+    """
+    An append-only file with a line for each committed transaction of the
+    working set, listing the writes it made as [sql, params], so that changes
+    not yet flushed survive a crash. The line is synced to disk before the
+    transaction commits in memory. The first line, {"base": digest}, gives the
+    base_hash of the database the transactions were made to, so that they are
+    only ever applied to that database.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "a", encoding="utf-8")
+        # held while the session runs so that no other session replays the log
+        try:
+            fcntl.flock(self.file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self.file.close()
+            raise
+        # the writes of the open transaction, None outside of one
+        self.pending = None
+        # transactions logged since the last flush
+        self.entries = 0
+        # the base_hash written before the first transaction after a truncate
+        self.base = None
+        self.headed = os.path.getsize(path) > 0
+
+    def begin(self):
+        self.pending = []
+
+    def record(self, sql: str, params):
+        if self.pending is not None:
+            self.pending.append([sql, _encode(params)])
+
+    def commit(self):
+        if self.pending:
+            if not self.headed:
+                self.file.write(json.dumps({"base": self.base}) + "\n")
+                self.headed = True
+            self.file.write(json.dumps(self.pending) + "\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.entries += 1
+        self.pending = None
+
+    def rollback(self):
+        self.pending = None
+
+    def savepoint(self) -> int:
+        """Mark the writes so far so that those after can be dropped."""
+        return len(self.pending)
+
+    def rollback_to(self, mark: int):
+        del self.pending[mark:]
+
+    def truncate(self, base: str):
+        """Empty the log once the database has base_hash base."""
+        self.file.truncate(0)
+        self.entries = 0
+        self.base = base
+        self.headed = False
+
+    def close(self):
+        self.file.close()
+
+
+class RedoCursor(sqlite3.Cursor):
+    """A cursor that passes the writes made through it to log when it is set."""
+
+    log: Optional[RedoLog] = None
+
+    def execute(self, sql, params=()):
+        if self.log is not None and not sql.lstrip().upper().startswith(_read_keywords):
+            self.log.record(sql, params)
+        return super().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        if self.log is not None:
+            seq_of_params = [*seq_of_params]
+            for params in seq_of_params:
+                self.log.record(sql, params)
+        return super().executemany(sql, seq_of_params)
+
+
+def read_redo(path: str) -> Tuple[Optional[str], List[list]]:
+    """
+    The base_hash and transactions logged at path. A last line cut short by a
+    crash was never committed and is ignored.
+    """
+    base, entries = None, []
+    if not os.path.exists(path):
+        return base, entries
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                break
+            if isinstance(entry, dict):
+                base = entry.get("base")
+            else:
+                entries.append(entry)
+    return base, entries
+
+
+def replay(store, entries: List[list]):
+    """Apply each of entries as a transaction of store."""
+    for entry in entries:
+        with store.transaction():
+            for sql, params in entry:
+                store.cursor.execute(sql, _decode(params))
+
+
+def replay_log(store, path: str, base: str) -> int:
+    """
+    Apply the transactions logged at path to store, all or none, if they were
+    logged against the database with base_hash base, and return how many there
+    were. A log written against another database, as when another session
+    changed the file after the last flush, or one that fails to apply is moved
+    aside with set_aside and reported on stderr rather than applied.
+    """
+    logged_base, entries = read_redo(path)
+    if not entries:
+        return 0
+    if logged_base != base:
+        problem = "the database has changed since they were logged"
+    else:
+        try:
+            with store.transaction():
+                replay(store, entries)
+            click_log(f"replayed {len(entries)} transactions from {path}")
+            return len(entries)
+        except sqlite3.Error as e:
+            problem = f"applying them failed: {e}"
+    kept = set_aside(path)
+    message = (
+        f"{len(entries)} unflushed transactions of a session in memory mode were "
+        f"not applied since {problem}; moved {path} to {kept}"
+    )
+    click_log(message)
+    print(message, file=sys.stderr)
+    return 0
+
+
+def recover(store, path: str) -> int:
+    """
+    Apply the transactions left at path by a session in memory mode that ended
+    without flushing them with replay_log, remove the log and return how many
+    there were. A log still locked by a running session is left alone. Called
+    on import, so errors are reported rather than raised.
+    """
+    if not os.path.exists(path):
+        return 0
+    try:
+        with open(path, "a") as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                click_log(f"{path} is in use by a session in memory mode")
+                return 0
+            replayed = replay_log(store, path, base_hash(store.conn))
+            if os.path.exists(path):
+                os.remove(path)
+    except (OSError, sqlite3.Error) as e:
+        print(f"could not recover {path}: {e}", file=sys.stderr)
+        return 0
+    return replayed
+
+
+class WorkingSet:
+    """
+    The database file loaded into the in-memory database of store with
+    backup(). Changes are copied back to the file by a background thread every
+    flush_interval seconds, by flush and at exit, and are kept in the redo log
+    in the meantime. The working set assumes that no other session writes to
+    the file while it is open: a flush that finds the file changed refuses to
+    overwrite it.
+    """
+
+    def __init__(self, store, db_path: str):
+        self.store = store
+        self.db_path = db_path
+        self.disk = sqlite3.connect(db_path, check_same_thread=False)
+        self.disk.execute("PRAGMA journal_mode=WAL")
+        self.disk.backup(store.conn)
+        self.version = self._disk_version()
+        store.cursor = store.conn.cursor(RedoCursor)
+        self.log = None
+        self.dirty = False
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def _disk_version(self) -> int:
+        return self.disk.execute("PRAGMA data_version").fetchone()[0]
+
+    def start(self):
+        """
+        Start logging and the flush timer once the schema is in place, after
+        applying any transactions left in the redo log by a session that ended
+        without flushing them, as replay_log does, and writing those to disk.
+        """
+        path = redo_path(self.db_path)
+        try:
+            self.log = RedoLog(path)
+        except BlockingIOError:
+            raise SystemExit(f"{path} is in use by another session in memory mode")
+        # the working set may differ from the file by migrations already
+        base = base_hash(self.disk)
+        replay_log(self.store, path, base)
+        if not os.path.exists(path):
+            # set aside: log to a new file
+            self.log.close()
+            self.log = RedoLog(path)
+        self.log.base = base
+        # migrations and replayed transactions change the working set unlogged
+        disk_user_version = self.disk.execute("PRAGMA user_version").fetchone()[0]
+        self.dirty = (
+            self.store.conn.total_changes > 0
+            or self.store.user_version() != disk_user_version
+        )
+        self.store.redo = self.store.cursor.log = self.log
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        self._flush_logged()
+
+    def _run(self):
+        while not self.stopped.wait(flush_interval):
+            self._flush_logged()
+
+    def _flush_logged(self):
+        """Flush, logging rather than raising errors, to try again later."""
+        try:
+            self.flush()
+        except (DiskChangedError, sqlite3.Error) as e:
+            click_log(f"working set not flushed: {e}")
+
+    def flush(self) -> bool:
+        """
+        Copy the working set to the file if it changed since the last flush and
+        clear the redo log. Returns whether anything was written.
+        """
+        with self.store.lock:
+            if not (self.dirty or self.log.entries):
+                return False
+            if self._disk_version() != self.version:
+                raise DiskChangedError(
+                    f"{self.db_path} was changed by another session; "
+                    f"unflushed changes are kept in {self.log.path}"
+                )
+            self.store.conn.backup(self.disk)
+            self.log.truncate(base_hash(self.store.conn))
+            self.dirty = False
+            self.version = self._disk_version()
+            return True
+
+    def close(self):
+        """Stop the timer and flush. Registered with atexit."""
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        try:
+            self.flush()
+        except DiskChangedError as e:
+            # keep the changes where the next session will not replay them
+            # over those of the other session
+            kept = set_aside(self.log.path)
+            print(f"{e}; moved the redo log to {kept}", file=sys.stderr)
+        except sqlite3.Error as e:
+            print(f"working set not flushed: {e}", file=sys.stderr)
+        finally:
+            self.log.close()
+            self.disk.close()
@@ -48,6 +48,10 @@ setup(
         "lorem>=0.1.1",
         "pyperclip>=1.7.0",
     ],
+    extras_require={
+        # vectorized scoring for the related command
+        "vectors": ["numpy>=1.21", "scipy>=1.7"],
+    },
     entry_points={
         "console_scripts": [
             "idea=modules.__main__:main",  # Correct the path to `main` in `modules/__main__.py`
@@ -0,0 +1,39 @@
+import os
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+import pytest
+
+root = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def run_python(tmp_path):
+    """
+    Run code in a new interpreter with HOME and IDEAHOME in tmp_path, since the
+    database is opened when modules.database is imported, and return the
+    completed process. Extra environment variables are passed as keywords.
+    """
+
+    def run(code: str, check: bool = True, **env) -> subprocess.CompletedProcess:
+        environ = {k: v for k, v in os.environ.items() if k != "IDEAMEMORY"}
+        environ.update(
+            HOME=str(tmp_path),
+            IDEAHOME=str(tmp_path / "home"),
+            PYTHONPATH=str(root),
+            **env,
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", textwrap.dedent(code)],
+            cwd=tmp_path,
+            env=environ,
+            capture_output=True,
+            text=True,
+        )
+        if check:
+            assert result.returncode == 0, result.stderr
+        return result
+
+    return run
@@ -0,0 +1,65 @@
+import glob
+import json
+import os
+
+# A session in memory mode that adds ideas and ends without flushing them, as
+# after a crash, leaving them only in its redo log. Before it ends, the code
+# given for CHANGE runs while the session is still open.
+crashed_session = """
+import os, subprocess, sys
+from modules import database as d
+
+d.working.stopped.set()
+d.insert_idea("kept in the log", "", 0, 1, 0, 0)
+d.insert_idea("also in the log", "", 0, 1, 0, 0)
+CHANGE
+os._exit(0)
+"""
+# an idea added meanwhile by a normal session, which leaves the locked log be
+change_on_disk = """
+subprocess.run(
+    [sys.executable, "-c", "from modules import database as d; "
+     "d.insert_idea('added on disk', '', 0, 1, 0, 0)"],
+    env={k: v for k, v in os.environ.items() if k != "IDEAMEMORY"},
+    check=True,
+)
+"""
+names = """
+import json
+from modules import database as d
+print(json.dumps(sorted(name for (name,) in d.c.execute(
+    "SELECT name FROM ideas WHERE id > 0"))))
+"""
+
+
+def redo_logs(tmp_path):
+    return sorted(
+        os.path.basename(path) for path in glob.glob(str(tmp_path / "home" / "*-redo*"))
+    )
+
+
+def test_next_session_replays_the_log(run_python, tmp_path):
+    run_python(crashed_session.replace("CHANGE", ""), IDEAMEMORY="1")
+    assert redo_logs(tmp_path) == ["ideas.db-redo"]
+    result = run_python(names)
+    assert json.loads(result.stdout) == ["also in the log", "kept in the log"]
+    assert redo_logs(tmp_path) == []
+
+
+def test_next_session_in_memory_mode_replays_the_log(run_python, tmp_path):
+    run_python(crashed_session.replace("CHANGE", ""), IDEAMEMORY="1")
+    result = run_python(names, IDEAMEMORY="1")
+    assert json.loads(result.stdout) == ["also in the log", "kept in the log"]
+    # flushed at start and emptied
+    assert os.path.getsize(tmp_path / "home" / "ideas.db-redo") == 0
+
+
+def test_log_of_a_changed_database_is_set_aside(run_python, tmp_path):
+    run_python(crashed_session.replace("CHANGE", change_on_disk), IDEAMEMORY="1")
+    result = run_python(names)
+    assert json.loads(result.stdout) == ["added on disk"]
+    assert "not applied" in result.stderr
+    [kept] = redo_logs(tmp_path)
+    assert kept.startswith("ideas.db-redo.")
+    # later sessions start cleanly
+    assert json.loads(run_python(names).stdout) == ["added on disk"]